@@ -0,0 +1,234 @@
+"""
+Benchmark PDF assembly: memory per writer, size and time per page encoding
+
+Builds books of 10, 30 and 100 synthetic coloring pages and reports:
+  1. per PDF_WRITER mode: peak RSS, peak traced Python allocations and what
+     the canvas still holds after the last page
+  2. per B&W page encoding (24-bit RGB, 1-bit Flate, CCITT G4): PDF size and
+     assembly time with the streaming writer
+  3. colored pages as 24-bit RGB vs palette-quantized: size, time and PSNR
+Every config runs in its own subprocess so peak RSS is not inherited from
+earlier runs.
+
+Usage:
+    python benchmark_pdf.py                 # 10, 30 and 100 pages
+    python benchmark_pdf.py 10 50 200       # custom page counts
+"""
+import io
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+DEFAULT_PAGE_COUNTS = [10, 30, 100]
+WRITERS = ['stream', 'reportlab']
+# 'rgb' is the full-color path; the others are bilevel (1-bit) line-art encodings
+ENCODINGS = ['rgb', 'flate', 'g4']
+COLOR_ENCODINGS = ['color-rgb', 'color-palette']
+# Customer colors used for the synthetic colored pages
+SEED_COLORS = ['#FF6B6B', '#4ECDC4', '#FFE66D', '#1A535C', '#FF9F1C']
+IMAGE_SIZE = 1024
+
+
+def create_test_page(seed):
+    """
+    A 1024x1024 line-art page; each seed differs so no two pages share an image.
+    Drawn at 2x and downsampled so the lines are anti-aliased like model output.
+    """
+    from PIL import Image, ImageDraw
+
+    size = IMAGE_SIZE * 2
+    img = Image.new('RGB', (size, size), 'white')
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([0, 0, size - 1, size - 1], outline='black', width=10)
+
+    cx, cy = size // 2, size // 2
+    petals = 5 + seed % 7
+    for i in range(petals):
+        rad = math.radians(i * 360 / petals + seed * 13)
+        px = cx + int((240 + seed % 120) * math.cos(rad))
+        py = cy + int((240 + seed % 120) * math.sin(rad))
+        draw.ellipse([px - 160, py - 160, px + 160, py + 160], outline='black', width=6)
+    for i in range(12):
+        x = (seed * 74 + i * 166) % size
+        y = (seed * 106 + i * 262) % size
+        draw.line([x, 0, size - x, y], fill='black', width=4)
+
+    img = img.resize((IMAGE_SIZE, IMAGE_SIZE), Image.LANCZOS)
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def create_colored_page(seed):
+    """
+    A 1024x1024 colored page: flat fills in the customer's colors with slight
+    shade drift, a soft lighting gradient and sensor-like noise, as the model
+    tends to return them.
+    """
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    rng = np.random.default_rng(seed)
+    size = IMAGE_SIZE * 2
+    img = Image.new('RGB', (size, size), 'white')
+    draw = ImageDraw.Draw(img)
+    for i in range(25):
+        x, y = rng.integers(0, size, 2)
+        r = int(rng.integers(60, 300))
+        base = np.array([int(SEED_COLORS[i % len(SEED_COLORS)][j:j + 2], 16) for j in (1, 3, 5)])
+        fill = tuple(int(v) for v in np.clip(base + rng.integers(-12, 12, 3), 0, 255))
+        draw.ellipse([x - r, y - r, x + r, y + r], fill=fill, outline='black', width=6)
+    img = img.resize((IMAGE_SIZE, IMAGE_SIZE), Image.LANCZOS)
+
+    pixels = np.asarray(img).astype(np.float32)
+    pixels *= (0.93 + 0.07 * np.linspace(0, 1, IMAGE_SIZE))[None, :, None]
+    pixels += rng.normal(0, 2, pixels.shape)
+    img = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def peak_rss_mb():
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def current_rss_mb():
+    """Resident set size now, read the way the generation queue's admission control reads it"""
+    from generation_queue import _current_rss_mb
+    return _current_rss_mb()
+
+
+def run_single(writer, pages, encoding='rgb', trace=True):
+    """Assemble one book in this process and return its measurements"""
+    os.environ['PDF_WRITER'] = writer
+    bilevel = encoding in ('flate', 'g4')
+    if bilevel:
+        os.environ['PDF_BILEVEL_CODEC'] = encoding
+    palette = SEED_COLORS if encoding == 'color-palette' else None
+    import pdf_generator
+
+    # Encode the pages up front (as Gemini would deliver them) so only
+    # PDF assembly is measured
+    create_page = create_colored_page if encoding.startswith('color-') else create_test_page
+    page_data = [create_page(seed) for seed in range(pages)]
+    baseline_rss = peak_rss_mb()
+
+    output_path = os.path.join(tempfile.mkdtemp(), f'bench_{writer}_{encoding}_{pages}.pdf')
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+
+    c = pdf_generator.open_pdf_canvas(output_path, {'title': 'Benchmark'})
+    # The streaming writer has already flushed the title page (ReportLab: 0)
+    title_bytes = os.path.getsize(output_path) if os.path.exists(output_path) else 0
+    for page_number, data in enumerate(page_data, start=1):
+        pdf_generator.append_image_to_canvas(c, data, page_number=page_number,
+                                             bilevel=bilevel, palette=palette)
+    # What the canvas still holds after the last page, just before save()
+    retained, _ = tracemalloc.get_traced_memory()
+    pdf_generator.finalize_pdf(c, output_path)
+
+    elapsed = time.perf_counter() - started
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        'writer': writer,
+        'encoding': encoding,
+        'pages': pages,
+        'seconds': round(elapsed, 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'assembly_rss_mb': round(peak_rss_mb() - baseline_rss, 1),
+        'traced_peak_mb': round(traced_peak / 1024 / 1024, 1),
+        'retained_mb': round(retained / 1024 / 1024, 2),
+        'pdf_mb': round(os.path.getsize(output_path) / 1024 / 1024, 2),
+        'page_kb': round((os.path.getsize(output_path) - title_bytes) / pages / 1024, 1),
+        'palette_psnr_min': pdf_generator.get_codec_stats()['palette_psnr_min'],
+    }
+    os.remove(output_path)
+    return result
+
+
+def run_single_in_subprocess(script, *args):
+    """Run `script --single args...` in a fresh interpreter and return the JSON it prints"""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(script), '--single', *(str(arg) for arg in args)],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(script)),
+    ).stdout
+    # The result is the last line; the rest is pdf_generator's logging
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_in_subprocess(writer, pages, encoding='rgb', trace=True):
+    return run_single_in_subprocess(__file__, writer, pages, encoding, 'trace' if trace else 'notrace')
+
+
+def main(page_counts):
+    print(f"{'='*78}")
+    print("PDF assembly memory benchmark")
+    print(f"{'='*78}")
+    print(f"{'writer':<10} {'pages':>6} {'time s':>8} {'peak RSS':>10} {'assembly':>10} "
+          f"{'traced':>9} {'retained':>9} {'PDF MB':>8}")
+
+    results = []
+    for writer in WRITERS:
+        for pages in page_counts:
+            r = run_in_subprocess(writer, pages)
+            results.append(r)
+            print(f"{r['writer']:<10} {r['pages']:>6} {r['seconds']:>8} {r['peak_rss_mb']:>9}M "
+                  f"{r['assembly_rss_mb']:>9}M {r['traced_peak_mb']:>8}M {r['retained_mb']:>8}M {r['pdf_mb']:>8}")
+
+    print("\nassembly = peak RSS growth while writing the PDF (pages already in memory)")
+    print("traced   = peak Python allocations during assembly (tracemalloc)")
+    print("retained = allocations still held by the canvas after the last page, before save()")
+    for writer in WRITERS:
+        retained = [r['retained_mb'] for r in results if r['writer'] == writer]
+        print(f"   {writer}: retained {min(retained)}–{max(retained)} MB across {page_counts} pages")
+
+    print(f"\n{'='*78}")
+    print("B&W page encoding (streaming writer, no tracing)")
+    print(f"{'='*78}")
+    print(f"{'encoding':<10} {'pages':>6} {'time s':>8} {'PDF MB':>8} {'KB/page':>8} {'vs rgb':>8}")
+    for pages in page_counts:
+        rgb = None
+        for encoding in ENCODINGS:
+            r = run_in_subprocess('stream', pages, encoding, trace=False)
+            results.append(r)
+            rgb = rgb or r
+            ratio = r['page_kb'] / rgb['page_kb'] if rgb['page_kb'] else 0
+            print(f"{encoding:<10} {pages:>6} {r['seconds']:>8} {r['pdf_mb']:>8} {r['page_kb']:>8} {ratio:>7.0%}")
+    print("\nPDF MB includes the title page; KB/page and 'vs rgb' exclude it")
+
+    print(f"\n{'='*78}")
+    print("Colored page encoding (streaming writer, no tracing)")
+    print(f"{'='*78}")
+    print(f"{'encoding':<14} {'pages':>6} {'time s':>8} {'KB/page':>8} {'vs rgb':>8} {'min PSNR':>9}")
+    for pages in page_counts:
+        rgb = None
+        for encoding in COLOR_ENCODINGS:
+            r = run_in_subprocess('stream', pages, encoding, trace=False)
+            results.append(r)
+            rgb = rgb or r
+            ratio = r['page_kb'] / rgb['page_kb'] if rgb['page_kb'] else 0
+            psnr = f"{r['palette_psnr_min']} dB" if r['palette_psnr_min'] is not None else '-'
+            print(f"{encoding:<14} {pages:>6} {r['seconds']:>8} {r['page_kb']:>8} {ratio:>7.0%} {psnr:>9}")
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 6 and sys.argv[1] == '--single':
+        print(json.dumps(run_single(sys.argv[2], int(sys.argv[3]), sys.argv[4], sys.argv[5] == 'trace')))
+    else:
+        counts = [int(arg) for arg in sys.argv[1:]] or DEFAULT_PAGE_COUNTS
+        main(counts)
@@ -0,0 +1,282 @@
+"""
+PDF assembly benchmark suite with a stored baseline
+
+Drives open_pdf_canvas / append_image_to_canvas / finalize_pdf with the
+synthetic coloring pages of the sizing test scripts (test_and_open_pdf.py's
+flower page, test_square_vs_portrait.py's page at any size) across page
+sizes, page counts and book modes (B&W / colored), each in its own subprocess
+(benchmark_pdf.py's harness: same runner, RSS readings and customer colors).
+
+Per config it reports pages/sec, peak traced allocations (tracemalloc),
+peak RSS growth and output bytes per page, writes them as JSON and compares
+them with benchmark_baseline.json. Timings depend on the machine: refresh
+the baseline (--update-baseline) on the machine you compare on.
+
+Usage:
+    python benchmark_suite.py                    # run + compare with the baseline
+    python benchmark_suite.py --quick            # smaller matrix
+    python benchmark_suite.py --output out.json  # also save the results
+    python benchmark_suite.py --update-baseline  # store these results as the baseline
+Exits with status 1 when a metric regresses beyond its tolerance.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmark_pdf import SEED_COLORS, current_rss_mb, peak_rss_mb, run_single_in_subprocess
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# (name, width, height) of the source pages
+SIZES = [
+    ('square-1024', 1024, 1024),
+    ('portrait-768x1024', 768, 1024),
+    ('square-2048', 2048, 2048),
+]
+PAGE_COUNTS = [10, 30]
+MODES = ['bw', 'colored']
+QUICK_SIZES = SIZES[:1]
+QUICK_PAGE_COUNTS = [10]
+
+# Allowed drift against the baseline before a metric counts as a regression:
+# (metric, direction that is worse, relative tolerance)
+TOLERANCES = [
+    ('pages_per_sec', 'lower', 0.20),
+    ('traced_peak_mb', 'higher', 0.20),
+    ('rss_growth_mb', 'higher', 0.25),
+    ('bytes_per_page', 'higher', 0.10),
+]
+# Differences smaller than these absolute amounts are noise, never regressions
+NOISE_FLOOR = {'traced_peak_mb': 1.0, 'rss_growth_mb': 5.0, 'bytes_per_page': 1024}
+
+
+# ---------------------------------------------------------------------------
+# Synthetic pages (from the sizing test scripts)
+# ---------------------------------------------------------------------------
+
+def _source_page(width, height):
+    """The sizing scripts' flower page at the requested size"""
+    if (width, height) == (1024, 1024):
+        from test_and_open_pdf import create_coloring_page
+        return create_coloring_page()
+    from test_square_vs_portrait import create_test_image
+    return create_test_image(width, height, 'BENCH')
+
+
+def _colorize(base):
+    """Flood-fill the white regions of a line-art page with the customer colors"""
+    from PIL import ImageDraw
+
+    img = base.copy()
+    w, h = img.size
+    step = max(w, h) // 7
+    n = 0
+    for y in range(step // 2, h, step):
+        for x in range(step // 2, w, step):
+            if img.getpixel((x, y)) == (255, 255, 255):
+                color = SEED_COLORS[n % len(SEED_COLORS)]
+                fill = tuple(int(color[j:j + 2], 16) for j in (1, 3, 5))
+                ImageDraw.floodfill(img, (x, y), fill, thresh=60)
+                n += 1
+    return img
+
+
+def _page_variant(base, seed, colored):
+    """
+    A distinct page derived from the base image, so no two pages are
+    byte-identical (colored pages get filled shapes in the customer colors)
+    """
+    from PIL import ImageDraw
+
+    img = base.copy()
+    draw = ImageDraw.Draw(img)
+    w, h = img.size
+    for i in range(6):
+        x = (seed * 97 + i * 211) % w
+        y = (seed * 53 + i * 149) % h
+        fill = None
+        if colored:
+            color = SEED_COLORS[(seed + i) % len(SEED_COLORS)]
+            fill = tuple(int(color[j:j + 2], 16) for j in (1, 3, 5))
+        draw.ellipse([x - 30, y - 30, x + 30, y + 30], fill=fill, outline='black', width=3)
+
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+# ---------------------------------------------------------------------------
+# One config (runs in a subprocess)
+# ---------------------------------------------------------------------------
+
+def _warm_cover(output_path):
+    """
+    Open and discard one canvas so the one-time cover preparation (decoding,
+    resampling and encoding frontpage.png) is cached before anything is timed
+    """
+    import pdf_generator
+
+    pdf_generator.discard_pdf(pdf_generator.open_pdf_canvas(output_path, {'title': 'Benchmark'}), output_path)
+
+
+def _assemble(page_data, output_path, colored):
+    """Write one book; returns (seconds, title page bytes, total bytes)"""
+    import pdf_generator
+
+    started = time.perf_counter()
+    c = pdf_generator.open_pdf_canvas(output_path, {'title': 'Benchmark'})
+    title_bytes = os.path.getsize(output_path) if os.path.exists(output_path) else 0
+    for page_number, data in enumerate(page_data, start=1):
+        pdf_generator.append_image_to_canvas(
+            c, data, page_number=page_number,
+            bilevel=not colored, palette=SEED_COLORS if colored else None,
+        )
+    pdf_generator.finalize_pdf(c, output_path)
+    elapsed = time.perf_counter() - started
+    total_bytes = os.path.getsize(output_path)
+    os.remove(output_path)
+    return elapsed, title_bytes, total_bytes
+
+
+def run_config(size_name, pages, mode):
+    """
+    Assemble one book twice: an untraced pass for pages/sec, then a pass
+    under tracemalloc for the allocation peak. The cover is prepared first,
+    so both passes measure page assembly only.
+    """
+    import pdf_generator  # noqa: F401 – imported before the RSS baseline
+
+    _, width, height = next(s for s in SIZES if s[0] == size_name)
+    base = _source_page(width, height)
+    colored = mode == 'colored'
+    if colored:
+        base = _colorize(base)
+    page_data = [_page_variant(base, seed, colored) for seed in range(pages)]
+    output_path = os.path.join(tempfile.mkdtemp(), f'suite_{size_name}_{mode}_{pages}.pdf')
+
+    _warm_cover(output_path)
+    rss_before = current_rss_mb()
+    elapsed, title_bytes, total_bytes = _assemble(page_data, output_path, colored)
+
+    tracemalloc.start()
+    _assemble(page_data, output_path, colored)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'pages_per_sec': round(pages / elapsed, 2),
+        'traced_peak_mb': round(traced_peak / 1024 / 1024, 2),
+        'rss_growth_mb': round(max(0.0, peak_rss_mb() - rss_before), 1),
+        'bytes_per_page': int((total_bytes - title_bytes) / pages),
+        'total_bytes': total_bytes,
+    }
+
+
+def _config_key(size_name, pages, mode):
+    return f"{size_name}/{mode}/{pages}p"
+
+
+def run_suite(sizes, page_counts, modes):
+    results = {}
+    for size_name, _, _ in sizes:
+        for mode in modes:
+            for pages in page_counts:
+                key = _config_key(size_name, pages, mode)
+                results[key] = run_single_in_subprocess(__file__, size_name, pages, mode)
+                r = results[key]
+                print(f"{key:<34} {r['pages_per_sec']:>8} {r['traced_peak_mb']:>9} "
+                      f"{r['rss_growth_mb']:>8} {r['bytes_per_page']:>10}", flush=True)
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Baseline comparison
+# ---------------------------------------------------------------------------
+
+def compare(results, baseline):
+    """Print per-metric deltas against the baseline; return the list of regressions"""
+    regressions = []
+    print(f"\n{'config':<34} {'metric':<16} {'baseline':>10} {'now':>10} {'change':>8}")
+    for key, now in results.items():
+        before = baseline.get(key)
+        if before is None:
+            print(f"{key:<34} (not in baseline)")
+            continue
+        for metric, worse, tolerance in TOLERANCES:
+            old, new = before.get(metric), now.get(metric)
+            if old in (None, 0) or new is None:
+                continue
+            change = (new - old) / old
+            regressed = (change < -tolerance) if worse == 'lower' else (change > tolerance)
+            if regressed and abs(new - old) < NOISE_FLOOR.get(metric, 0):
+                regressed = False
+            flag = '  ❌' if regressed else ''
+            print(f"{key:<34} {metric:<16} {old:>10} {new:>10} {change:>+7.0%}{flag}")
+            if regressed:
+                regressions.append((key, metric, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PDF assembly benchmark suite')
+    parser.add_argument('--quick', action='store_true', help='1 size, 10 pages')
+    parser.add_argument('--output', help='write the results JSON here')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='baseline JSON to compare with')
+    parser.add_argument('--update-baseline', action='store_true', help='store the results as the baseline')
+    args = parser.parse_args()
+
+    sizes = QUICK_SIZES if args.quick else SIZES
+    page_counts = QUICK_PAGE_COUNTS if args.quick else PAGE_COUNTS
+
+    print(f"{'='*78}")
+    print("PDF assembly benchmark suite")
+    print(f"{'='*78}")
+    print(f"{'config':<34} {'pages/s':>8} {'traced MB':>9} {'RSS MB':>8} {'bytes/page':>10}")
+    results = run_suite(sizes, page_counts, MODES)
+
+    document = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform()},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+    if args.update_baseline:
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                stored = json.load(f)
+            # Keep configs this run did not cover (e.g. a --quick update)
+            document['results'] = {**stored.get('results', {}), **results}
+        with open(args.baseline, 'w') as f:
+            json.dump(document, f, indent=2)
+        print(f"\n💾 Baseline updated: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\n⚠️ No baseline at {args.baseline} – run with --update-baseline to create one")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline.get('results', {}))
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) against the baseline from {baseline.get('created_at')}")
+        return 1
+    print(f"\n✅ No regressions against the baseline from {baseline.get('created_at')}")
+    return 0
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 5 and sys.argv[1] == '--single':
+        print(json.dumps(run_config(sys.argv[2], int(sys.argv[3]), sys.argv[4])))
+    else:
+        sys.exit(main())
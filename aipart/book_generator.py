@@ -4,21 +4,20 @@ Book generation orchestrator - Generates complete coloring books from user selec
 import os
 import json
 import base64
+import re
+import shutil
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from google import genai
-from google.genai import types
 from dotenv import load_dotenv
-from pdf_generator import open_pdf_canvas, append_image_to_canvas, finalize_pdf
-from PIL import Image
-import io
+from pdf_generator import open_pdf_variants, append_image_to_canvas, finalize_pdf, discard_pdf, thumbnail_dir
+import gemini_client
+import janitor
+import job_store
 
 # Load environment variables
 load_dotenv()
 
-# Google Imagen API configuration
-API_KEY = os.getenv('GOOGLE_API_KEY')
-client = genai.Client(api_key=API_KEY)
-
 # Configure folders
 GENERATED_FOLDER = 'generated_images'
 PDF_FOLDER = 'generated_pdfs'
@@ -28,6 +27,134 @@ if not os.path.exists(GENERATED_FOLDER):
 if not os.path.exists(PDF_FOLDER):
     os.makedirs(PDF_FOLDER)
 
+# Finished pages of queued jobs are kept here until their PDF is saved
+CHECKPOINT_FOLDER = os.path.join(GENERATED_FOLDER, 'checkpoints')
+
+# Also write every generated page to GENERATED_FOLDER (debugging only –
+# pages normally stay in memory from the Gemini response to the PDF)
+SPILL_PAGES = os.getenv('BOOK_SPILL_PAGES', '0') == '1'
+
+# Number of pages generated concurrently per book (Gemini calls are network-bound)
+PAGE_WORKERS = int(os.getenv('BOOK_PAGE_WORKERS', 4))
+
+# Page retries: attempts per page in one run, and total retries allowed per job
+PAGE_MAX_ATTEMPTS = int(os.getenv('BOOK_PAGE_MAX_ATTEMPTS', 3))
+JOB_RETRY_BUDGET = int(os.getenv('BOOK_JOB_RETRY_BUDGET', 6))
+
+
+# Previews written by /api/generate (generated_image.py) into GENERATED_FOLDER:
+# coloring_page_<content hash>.png (older ones: coloring_page_<timestamp>.png)
+_PREVIEW_FILENAME_RE = re.compile(r'^coloring_page_(?:[0-9a-f]{32}|[0-9_]+)\.png$')
+
+
+def is_valid_preview_filename(filename):
+    """True if filename names an existing stored preview (no path tricks)"""
+    return bool(
+        isinstance(filename, str)
+        and _PREVIEW_FILENAME_RE.match(filename)
+        and os.path.isfile(os.path.join(GENERATED_FOLDER, filename))
+    )
+
+
+def load_preview_image(filename):
+    """Encoded bytes of a stored preview the customer approved, or None"""
+    if not is_valid_preview_filename(filename):
+        return None
+    try:
+        path = os.path.join(GENERATED_FOLDER, filename)
+        janitor.touch(path)
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError as e:
+        print(f"⚠️ Could not read preview {filename}: {e}")
+        return None
+
+
+def _page_filename(page_num, kind):
+    """Unique temp filename for a page – safe when several pages finish in the same second"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return f"page_{page_num}_{kind}_{timestamp}_{uuid.uuid4().hex[:8]}.png"
+
+
+def _checkpoint_dir(job_id):
+    """Folder holding a job's finished pages"""
+    return os.path.join(CHECKPOINT_FOLDER, re.sub(r'[^A-Za-z0-9_-]', '_', str(job_id)))
+
+
+def _checkpointed_page(job_id, page_num, kind, produce):
+    """
+    Return the encoded image bytes for one page, generating it only if needed.
+
+    Without a job_id this is a single call to produce(). With a job_id a page
+    already stored by an earlier attempt (or before a restart) is reused as-is;
+    otherwise produce() is retried up to PAGE_MAX_ATTEMPTS times while the
+    job's JOB_RETRY_BUDGET lasts, and its bytes are written unchanged to disk
+    as a checkpoint.
+    """
+    if not job_id:
+        return produce()
+
+    stored = job_store.get_page_checkpoint(job_id, page_num, kind)
+    if stored and os.path.exists(stored):
+        print(f"    ♻️  Page {page_num} ({kind}) restored from checkpoint")
+        with open(stored, 'rb') as f:
+            return f.read()
+
+    for attempt in range(PAGE_MAX_ATTEMPTS):
+        if not job_store.claim_page_attempt(job_id, page_num, kind, JOB_RETRY_BUDGET):
+            print(f"    ⛔ Job retry budget ({JOB_RETRY_BUDGET}) exhausted – page {page_num} ({kind}) not retried")
+            return None
+        image_data = produce()
+        if image_data:
+            checkpoint_dir = _checkpoint_dir(job_id)
+            os.makedirs(checkpoint_dir, exist_ok=True)
+            checkpoint_path = os.path.join(checkpoint_dir, f"page_{page_num:03d}_{kind}.png")
+            with open(checkpoint_path + '.tmp', 'wb') as f:
+                f.write(image_data)
+            os.replace(checkpoint_path + '.tmp', checkpoint_path)
+            job_store.save_page_checkpoint(job_id, page_num, kind, checkpoint_path)
+            return image_data
+        if attempt + 1 < PAGE_MAX_ATTEMPTS:
+            print(f"    🔁 Retrying page {page_num} ({kind}), attempt {attempt + 2}/{PAGE_MAX_ATTEMPTS}")
+    return None
+
+
+def clear_checkpoints(job_id):
+    """Delete a job's stored pages once its PDF is saved"""
+    shutil.rmtree(_checkpoint_dir(job_id), ignore_errors=True)
+    job_store.clear_page_checkpoints(job_id)
+
+
+def _generate_in_order(task, count, width=PAGE_WORKERS):
+    """
+    Run task(page_num) for pages 1..count on a bounded worker pool and yield
+    (page_num, result) strictly in page order.
+
+    Pages that finish early wait in a reorder buffer until every earlier page
+    has been yielded. At most `width` pages are in flight or buffered at any
+    time, so memory is bounded by the pool width, not by the page count.
+    """
+    width = max(1, width)
+    pending = {}
+    next_submit = 1
+    with ThreadPoolExecutor(max_workers=width, thread_name_prefix='page') as pool:
+        try:
+            for page_num in range(1, count + 1):
+                # Keep the window full: never run more than `width` pages ahead
+                while next_submit <= count and next_submit < page_num + width:
+                    pending[next_submit] = pool.submit(task, next_submit)
+                    next_submit += 1
+                try:
+                    result = pending.pop(page_num).result()
+                except Exception as e:
+                    print(f"    ❌ Page {page_num} worker crashed: {str(e)}")
+                    result = None
+                yield page_num, result
+        finally:
+            # Consumer stopped early (error / generator closed) – drop queued work
+            for future in pending.values():
+                future.cancel()
+
 
 def build_prompt(theme, topic, difficulty, is_colored=False, colors=None):
     """Build a prompt for AI generation"""
@@ -79,16 +206,31 @@ CRITICAL: NO TEXT, NO WORDS, NO LETTERS, NO NUMBERS - only pure line art illustr
     return prompt
 
 
-def generate_single_page(theme, topic, difficulty, is_colored=False, colors=None, page_num=1, source_image_path=None):
-    """Generate a single coloring book page or color an existing B&W page"""
+def _spill_page(image_data, page_num, kind):
+    """Write the response bytes as-is to GENERATED_FOLDER when BOOK_SPILL_PAGES is on (debugging)"""
+    if SPILL_PAGES:
+        with open(os.path.join(GENERATED_FOLDER, _page_filename(page_num, kind)), 'wb') as f:
+            f.write(image_data)
+
+
+def generate_single_page(theme, topic, difficulty, is_colored=False, colors=None, page_num=1,
+                         source_image_path=None, source_image=None):
+    """
+    Generate a single coloring book page or color an existing B&W page.
+
+    Returns the encoded image bytes exactly as Gemini sent them (no decode,
+    no re-encode), or None on failure. The B&W source for coloring is given
+    as bytes (source_image) or as a file (source_image_path).
+    """
     try:
-        if is_colored and source_image_path:
+        if is_colored and source_image_path and source_image is None:
+            with open(source_image_path, 'rb') as f:
+                source_image = f.read()
+
+        if is_colored and source_image is not None:
             # COLORIER une image B&W existante avec Gemini 2.5 Flash
-            print(f"  � Coloring page {page_num} with Gemini 2.5 Flash...")
-            
-            # Ouvrir l'image B&W source
-            bw_image = Image.open(source_image_path)
-            
+            print(f"  🖍️ Coloring page {page_num} with Gemini 2.5 Flash...")
+
             # Construire le prompt de coloration
             color_list = ', '.join(colors) if colors else 'vibrant child-friendly colors'
             coloring_prompt = (
@@ -96,87 +238,41 @@ def generate_single_page(theme, topic, difficulty, is_colored=False, colors=None
                 "Do not change the line art. Stay within the lines. Use flat, solid colors without shading or texture. "
                 "Make it bright, fun, and perfect for kids!"
             )
-            
-            # Appeler Gemini 2.5 Flash pour colorier
-            response = client.models.generate_content(
-                model="gemini-2.5-flash-image",
-                contents=[coloring_prompt, bw_image]
-            )
-            
-            # Extraire l'image colorée
-            colored_image = None
-            for part in response.candidates[0].content.parts:
-                if part.inline_data is not None:
-                    colored_image = Image.open(io.BytesIO(part.inline_data.data))
-                    break
-            
+
+            # Appeler Gemini 2.5 Flash pour colorier – l'image B&W part telle quelle, sans décodage
+            # (client partagé : quota commun avec les aperçus, qui restent prioritaires)
+            colored_image = gemini_client.run(gemini_client.color(coloring_prompt, source_image))
             if colored_image:
-                # Sauvegarder l'image colorée
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f"page_{page_num}_colored_{timestamp}.png"
-                filepath = os.path.join(GENERATED_FOLDER, filename)
-                colored_image.save(filepath)
-                print(f"    ✅ Page {page_num} colored: {filename}")
-                return filepath
+                _spill_page(colored_image, page_num, 'colored')
+                print(f"    ✅ Page {page_num} colored ({len(colored_image) // 1024} KB in memory)")
+                return colored_image
             else:
                 print(f"    ❌ Failed to color page {page_num}")
                 return None
-        
+
         else:
             # GÉNÉRER une nouvelle page B&W avec Gemini 2.5 Flash Image
             print(f"  🎨 Generating B&W page {page_num} with Gemini 2.5 Flash Image...")
-            
+
             prompt = build_prompt(theme, topic, difficulty, is_colored=False, colors=None)
-            
+
             try:
-                # Generate image with Gemini 2.5 Flash Image
-                response = client.models.generate_content(
-                    model='gemini-2.5-flash-image',
-                    contents=[prompt]
-                )
-                
-                # Extract image from response parts
-                generated_image = None
-                for part in response.candidates[0].content.parts:
-                    if part.inline_data is not None:
-                        generated_image = Image.open(io.BytesIO(part.inline_data.data))
-                        break
-                
+                # Generate image with Gemini 2.5 Flash Image (shared, rate-limited client)
+                generated_image = gemini_client.run(gemini_client.generate(prompt))
                 if generated_image:
-                    # Save the generated image
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    filename = f"page_{page_num}_bw_{timestamp}.png"
-                    filepath = os.path.join(GENERATED_FOLDER, filename)
-                    generated_image.save(filepath)
-                    print(f"    ✅ Page {page_num} generated: {filename}")
-                    return filepath
+                    _spill_page(generated_image, page_num, 'bw')
+                    print(f"    ✅ Page {page_num} generated ({len(generated_image) // 1024} KB in memory)")
+                    return generated_image
                 else:
                     print(f"    ❌ No image found in response for page {page_num}")
                     return None
-                    
+
             except Exception as e:
                 print(f"    ❌ Failed to generate page {page_num}: {str(e)[:200]}")
                 import traceback
                 traceback.print_exc()
                 return None
-            
-            # if response.generated_images:
-            #     image_data = response.generated_images[0].image.image_bytes
-                
-            #     # Save to file
-            #     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            #     filename = f"page_{page_num}_bw_{timestamp}.png"
-            #     filepath = os.path.join(GENERATED_FOLDER, filename)
-                
-            #     with open(filepath, 'wb') as f:
-            #         f.write(image_data)
-                
-            #     print(f"    ✅ B&W page {page_num} generated: {filename}")
-            #     return filepath
-            # else:
-            #     print(f"    ❌ Failed to generate page {page_num}")
-            #     return None
-            
+
     except Exception as e:
         print(f"    ❌ Error generating page {page_num}: {str(e)}")
         import traceback
@@ -184,21 +280,100 @@ def generate_single_page(theme, topic, difficulty, is_colored=False, colors=None
         return None
 
 
-def generate_complete_book(session_data, preview_image_base64=None):
+def _future_value(future):
+    """Result of a finished future, or None if it failed or was cancelled"""
+    if future.cancelled():
+        return None
+    if future.exception() is not None:
+        print(f"    ❌ Pipeline stage crashed: {str(future.exception())}")
+        return None
+    return future.result()
+
+
+def _pipeline_in_order(first_stage, second_stage, count, width=PAGE_WORKERS):
+    """
+    Two-stage pipeline over slots 1..count, yielding (slot, first, second) in
+    slot order. second_stage(slot, first) only runs when first_stage(slot)
+    returned something; otherwise second is None.
+
+    Each stage has its own pool of `width` workers, so first_stage(n + 1) runs
+    while second_stage(n) is still busy and wall time per slot approaches the
+    slower stage rather than the sum of both. Slots are admitted through a
+    window of 2 × width, which bounds both the hand-off between the stages and
+    the reorder buffer in front of the PDF.
+    """
+    width = max(1, width)
+    window = 2 * width
+    pending = {}
+    next_submit = 1
+
+    # Second pool is entered first so it shuts down last: first-stage
+    # callbacks may still hand work to it while the first pool drains.
+    with ThreadPoolExecutor(max_workers=width, thread_name_prefix='stage2') as second_pool, \
+            ThreadPoolExecutor(max_workers=width, thread_name_prefix='stage1') as first_pool:
+
+        def hand_off(slot, first_future, slot_future):
+            first = _future_value(first_future)
+            if not first:
+                slot_future.set_result((first, None))
+                return
+            try:
+                second_future = second_pool.submit(second_stage, slot, first)
+            except RuntimeError:
+                # Pipeline is shutting down (consumer stopped early)
+                slot_future.set_result((first, None))
+                return
+            second_future.add_done_callback(
+                lambda f: slot_future.set_result((first, _future_value(f)))
+            )
+
+        def submit(slot):
+            slot_future = Future()
+            first_future = first_pool.submit(first_stage, slot)
+            first_future.add_done_callback(lambda f: hand_off(slot, f, slot_future))
+            pending[slot] = (first_future, slot_future)
+
+        try:
+            for slot in range(1, count + 1):
+                while next_submit <= count and next_submit < slot + window:
+                    submit(next_submit)
+                    next_submit += 1
+                first, second = pending.pop(slot)[1].result()
+                yield slot, first, second
+        finally:
+            for first_future, _ in pending.values():
+                first_future.cancel()
+
+
+def generate_complete_book(session_data, preview_image_base64=None, job_id=None, allow_partial=True,
+                           on_progress=None):
     """
     Generate a complete coloring book based on payment session data.
 
-    Uses a streaming approach: each page is generated, written to the PDF
-    canvas, and its temp file deleted before moving to the next page.
-    This keeps RAM usage at O(1) images regardless of page count.
+    Pages are generated concurrently on a bounded pool (BOOK_PAGE_WORKERS)
+    and written to the PDF canvas strictly in page order. Each page stays in
+    memory as the encoded bytes Gemini returned and is decoded exactly once,
+    by the canvas. Only the pages inside the pool window are ever pending, so
+    RAM stays bounded by the pool width, not the page count.
+
+    With a job_id, every finished page is also checkpointed on disk. Calling
+    again with the same job_id (a retry, or after a restart) regenerates only
+    the missing pages and rebuilds the PDF from stored ones.
 
     Args:
         session_data: Stripe session object or dict with metadata
-        preview_image_base64: IGNORED – all pages are regenerated fresh
+        preview_image_base64: IGNORED – the approved preview is referenced by
+            metadata['preview'] (its file in generated_images/) and reused as
+            page 1, or as the first coloring source in colored mode
+        job_id: Queue job id enabling page checkpoints and per-page retries
+        allow_partial: Save the PDF even if some pages are still missing
+        on_progress: Called as on_progress(pages_done, pages_total) after each
+            page is written to the PDF (or skipped as failed)
 
     Returns:
         str: Path to generated PDF, or None if failed
     """
+    c = None
     try:
         # ── Extract metadata ──────────────────────────────────────────────
         metadata = session_data.get('metadata', {})
@@ -217,6 +392,18 @@ def generate_complete_book(session_data, preview_image_base64=None):
         except Exception:
             colors = []
 
+        # The preview was already generated (and paid for) – reuse it as page 1
+        preview_image = load_preview_image(metadata.get('preview'))
+        if preview_image:
+            print(f"♻️  Reusing approved preview {metadata.get('preview')} as page 1")
+
+        def new_bw_page(page_num):
+            if page_num == 1 and preview_image:
+                return preview_image
+            return generate_single_page(
+                theme, topic, difficulty, is_colored=False, page_num=page_num
+            )
+
         print(f"\n{'='*60}")
         print(f"📚 Starting book generation for {customer_email}")
         print(f"   Format: {format_type} | Type: {book_type} | Pages: {total_pages}")
@@ -225,7 +412,7 @@ def generate_complete_book(session_data, preview_image_base64=None):
 
         # ── Prepare output paths ──────────────────────────────────────────
         timestamp    = datetime.now().strftime('%Y%m%d_%H%M%S')
-        pdf_filename = f"coloring_book_{timestamp}.pdf"
+        pdf_filename = f"coloring_book_{timestamp}_{uuid.uuid4().hex[:6]}.pdf"
         pdf_path     = os.path.join(PDF_FOLDER, pdf_filename)
 
         book_details = {
@@ -237,69 +424,100 @@ def generate_complete_book(session_data, preview_image_base64=None):
             'format'    : format_type,
         }
 
-        # ── Open canvas once (title page already added) ───────────────────
-        c        = open_pdf_canvas(pdf_path, book_details)
+        # ── Open one canvas per variant (PDF_VARIANTS, title pages
+        #    already added); every page is decoded once and drawn into all ──
+        c        = open_pdf_variants(pdf_path, book_details)
+        thumbs   = thumbnail_dir(pdf_path)  # page thumbnails for the success page
         pdf_page = 0  # tracks pages written to canvas
+        missing  = 0  # pages that could not be generated
+        expected = total_pages if book_type == 'blackwhite' else (total_pages // 2) * 2
+
+        def progress():
+            if on_progress:
+                on_progress(pdf_page + missing, expected)
 
         if book_type == 'blackwhite':
-            # ── B&W: generate → write → delete → next ────────────────────
-            print(f"🖤 Generating {total_pages} B&W pages (streaming)...")
-            for i in range(total_pages):
-                page_num = i + 1
-                img_path = generate_single_page(
-                    theme, topic, difficulty, is_colored=False, page_num=page_num
-                )
-                if img_path:
+            # ── B&W: generate concurrently → write in order ───────────────
+            print(f"🖤 Generating {total_pages} B&W pages ({PAGE_WORKERS} workers, streaming)...")
+
+            def bw_task(page_num):
+                return _checkpointed_page(job_id, page_num, 'bw', lambda: new_bw_page(page_num))
+
+            for page_num, image_data in _generate_in_order(bw_task, total_pages):
+                if image_data:
                     pdf_page += 1
-                    append_image_to_canvas(c, img_path, page_number=pdf_page, delete_after=True)
-                    print(f"   ✅ Page {page_num}/{total_pages} written to PDF (temp file deleted)")
+                    append_image_to_canvas(c, image_data, page_number=pdf_page, bilevel=True,
+                                           thumbnail_folder=thumbs)
+                    print(f"   ✅ Page {page_num}/{total_pages} written to PDF")
                 else:
+                    missing += 1
                     print(f"   ⚠️  Page {page_num} generation failed – skipping")
+                progress()
 
         else:
-            # ── Colored: for each slot generate B&W, color it, write both,
-            #    delete both – only 2 images in RAM at a time ──────────────
+            # ── Colored: pipeline – B&W page N+1 is generated while page N
+            #    is being colored; slots are written in order ──────────────
             num_slots = total_pages // 2
-            print(f"🌈 Generating {num_slots} B&W + {num_slots} colored pages (streaming)...")
-            for i in range(num_slots):
-                page_num = i + 1
-
-                # Step A – generate the B&W version
-                bw_path = generate_single_page(
-                    theme, topic, difficulty, is_colored=False, page_num=page_num
-                )
-                if not bw_path:
-                    print(f"   ⚠️  B&W page {page_num} failed – skipping slot")
-                    continue
+            print(f"🌈 Generating {num_slots} B&W + {num_slots} colored pages "
+                  f"({PAGE_WORKERS} B&W + {PAGE_WORKERS} coloring workers, pipelined)...")
+
+            # Stage A – generate the B&W version
+            def bw_stage(page_num):
+                return _checkpointed_page(job_id, page_num, 'bw', lambda: new_bw_page(page_num))
 
-                # Step B – color it (pass the B&W file as source)
-                colored_path = generate_single_page(
+            # Stage B – color it (pass the B&W bytes as source)
+            def color_stage(page_num, bw_image):
+                return _checkpointed_page(job_id, page_num, 'colored', lambda: generate_single_page(
                     theme, topic, difficulty,
                     is_colored=True,
                     colors=colors,
                     page_num=page_num,
-                    source_image_path=bw_path,
-                )
+                    source_image=bw_image,
+                ))
 
-                # Step C – write B&W page to PDF, delete temp file
+            for page_num, bw_image, colored_image in _pipeline_in_order(bw_stage, color_stage, num_slots):
+                if not bw_image:
+                    missing += 2
+                    print(f"   ⚠️  B&W page {page_num} failed – skipping slot")
+                    progress()
+                    continue
+
+                # Step C – write B&W page to PDF (line art → 1-bit image)
                 pdf_page += 1
-                append_image_to_canvas(c, bw_path, page_number=pdf_page, delete_after=True)
+                append_image_to_canvas(c, bw_image, page_number=pdf_page, bilevel=True,
+                                       thumbnail_folder=thumbs)
+                progress()
 
-                # Step D – write colored page to PDF, delete temp file
-                if colored_path:
+                # Step D – write colored page to PDF (indexed, seeded with the customer's colors)
+                if colored_image:
                     pdf_page += 1
-                    append_image_to_canvas(c, colored_path, page_number=pdf_page, delete_after=True)
+                    append_image_to_canvas(c, colored_image, page_number=pdf_page, palette=colors,
+                                           thumbnail_folder=thumbs)
+                else:
+                    missing += 1
+                progress()
 
-                print(f"   ✅ Slot {page_num}/{num_slots} written to PDF (temp files deleted)")
+                print(f"   ✅ Slot {page_num}/{num_slots} written to PDF")
 
         # ── Save PDF ──────────────────────────────────────────────────────
         if pdf_page == 0:
             print("❌ No pages were generated – aborting PDF")
+            discard_pdf(c, pdf_path)
+            return None
+        if missing and not allow_partial:
+            print(f"❌ {missing} page(s) still missing – keeping checkpoints for the next attempt")
+            discard_pdf(c, pdf_path)
             return None
 
         finalize_pdf(c, pdf_path)
-        size_mb = os.path.getsize(pdf_path) / 1024 / 1024
-        print(f"✅ PDF created: {pdf_path}  ({size_mb:.2f} MB, {pdf_page} pages)\n")
+        for path in [*c.paths().values(), thumbs]:
+            janitor.track(path)
+        if job_id:
+            clear_checkpoints(job_id)
+        for variant, path in c.paths().items():
+            size_mb = os.path.getsize(path) / 1024 / 1024
+            print(f"✅ PDF created ({variant}): {path}  ({size_mb:.2f} MB, {pdf_page} pages)")
+        print()
 
         print(f"\n{'='*60}")
         print(f"🎉 Book generation complete for {customer_email}!")
@@ -311,4 +529,6 @@ def generate_complete_book(session_data, preview_image_base64=None):
         print(f"❌ Error in book generation: {str(e)}")
         import traceback
         traceback.print_exc()
+        if c is not None:
+            discard_pdf(c, pdf_path)
         return None
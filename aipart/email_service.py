@@ -183,7 +183,8 @@ def send_pdf_email(to_email, pdf_path, book_details):
     
     Args:
         to_email (str): Recipient email address
-        pdf_path (str): Path to the generated PDF file
+        pdf_path (str): Path to the generated PDF file (its email variant
+            is attached instead when it exists)
         book_details (dict): Dictionary containing book information
     
     Returns:
@@ -259,6 +260,12 @@ def send_pdf_email(to_email, pdf_path, book_details):
     </html>
     """
     
+    # Attach the small email build of the book when it was generated
+    from pdf_generator import variant_path
+    email_path = variant_path(pdf_path, 'email')
+    if os.path.exists(email_path):
+        pdf_path = email_path
+    
     return send_email_via_sendgrid(to_email, subject, html_content, pdf_path)
 
 
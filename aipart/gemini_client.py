@@ -0,0 +1,329 @@
+"""
+Shared Gemini client - one client and one rate limiter for the whole process
+Previews (/api/generate) and book pages share the quota through a token bucket
+(requests per minute + concurrency cap); previews get a priority lane.
+The concurrency cap adapts (AIMD) to upstream latency and 429/5xx errors.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from google import genai
+from google.genai import errors, types
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+API_KEY = os.getenv('GOOGLE_API_KEY')
+IMAGE_MODEL = 'gemini-2.5-flash-image'
+
+# Quota shared by every Gemini call in this process
+REQUESTS_PER_MINUTE = float(os.getenv('GEMINI_REQUESTS_PER_MINUTE', 60))
+MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', 8))
+MIN_CONCURRENCY = int(os.getenv('GEMINI_MIN_CONCURRENCY', 1))
+INITIAL_CONCURRENCY = int(os.getenv('GEMINI_INITIAL_CONCURRENCY', 4))
+
+# AIMD tuning: back off when p95 latency exceeds the healthy baseline by this factor
+LATENCY_TOLERANCE = float(os.getenv('GEMINI_LATENCY_TOLERANCE', 1.5))
+BACKOFF_FACTOR = 0.5
+LATENCY_WINDOW = 50
+# Minimum seconds between two decreases, so one burst of errors halves only once
+DECREASE_COOLDOWN_SECONDS = 10
+# Only grow the limit while recent calls succeed at least this often
+HEALTHY_SUCCESS_RATE = 0.95
+# Concurrency slots that only previews may use, so a big book never blocks them
+PREVIEW_RESERVED_SLOTS = int(os.getenv('GEMINI_PREVIEW_RESERVED_SLOTS', 1))
+
+# Lower value = served first
+PRIORITY_PREVIEW = 0
+PRIORITY_BOOK = 1
+
+client = genai.Client(api_key=API_KEY)
+
+
+class AimdController:
+    """
+    Additive-increase / multiplicative-decrease concurrency limit.
+
+    Every call reports its latency and outcome. After `limit` consecutive
+    healthy calls made while the limit was actually in use, and while the
+    recent success rate is at least HEALTHY_SUCCESS_RATE, the limit grows
+    by one. A 429/5xx, or a p95 latency above LATENCY_TOLERANCE × the healthy
+    baseline, halves it (at most once per cooldown). A latency backoff that
+    actually lowers the limit re-anchors the baseline at the new p95, so a
+    lasting shift in upstream latency costs one halving and increases then
+    resume; only 429/5xx keep the limit down. A p95 rise during a cooldown
+    leaves the baseline alone, so it still triggers a backoff afterwards.
+    """
+
+    def __init__(self, initial, minimum, maximum):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.outcomes = deque(maxlen=LATENCY_WINDOW)
+        self.baseline_p95 = None
+        self.decisions = deque(maxlen=20)
+        self._healthy_streak = 0
+        self._last_decrease = 0.0
+
+    def p95(self):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def _decide(self, action, reason):
+        self.decisions.append({
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'action': action,
+            'limit': self.limit,
+            'reason': reason,
+        })
+        print(f"🎚️  Gemini concurrency {action} → {self.limit} ({reason})")
+
+    def _decrease(self, reason):
+        """Halve the limit unless cooling down or at the minimum; returns whether it changed"""
+        now = time.monotonic()
+        self._healthy_streak = 0
+        if now - self._last_decrease < DECREASE_COOLDOWN_SECONDS or self.limit == self.minimum:
+            return False
+        self._last_decrease = now
+        self.limit = max(self.minimum, int(self.limit * BACKOFF_FACTOR))
+        self._decide('decrease', reason)
+        return True
+
+    def record(self, latency, outcome, saturated):
+        """
+        Feed one finished call. outcome is 'ok', 'throttled' (429),
+        'server_error' (5xx) or 'error' (anything else – not a load signal).
+        saturated tells whether in-flight calls had reached the limit.
+        """
+        self.outcomes.append(outcome)
+        if outcome in ('throttled', 'server_error'):
+            self._decrease(f'upstream {outcome}')
+            return
+        if outcome != 'ok':
+            return
+
+        self.latencies.append(latency)
+        p95 = self.p95()
+        if len(self.latencies) >= 10:
+            if self.baseline_p95 is None:
+                self.baseline_p95 = p95
+            elif p95 > self.baseline_p95 * LATENCY_TOLERANCE:
+                reason = f'p95 {p95:.1f}s > {LATENCY_TOLERANCE}× baseline {self.baseline_p95:.1f}s'
+                cooling = time.monotonic() - self._last_decrease < DECREASE_COOLDOWN_SECONDS
+                # Accept the new latency level once backed off for it (or with
+                # nothing left to back off); during a cooldown keep the old
+                # baseline so the first call after it still backs off
+                if self._decrease(reason) or (self.limit == self.minimum and not cooling):
+                    self.baseline_p95 = p95
+                return
+            else:
+                # Slowly track the healthy baseline
+                self.baseline_p95 = 0.9 * self.baseline_p95 + 0.1 * p95
+
+        if not saturated or self.success_rate() < HEALTHY_SUCCESS_RATE:
+            return
+        self._healthy_streak += 1
+        if self._healthy_streak >= self.limit and self.limit < self.maximum:
+            self._healthy_streak = 0
+            self.limit += 1
+            self._decide('increase', f'{self.limit - 1} healthy calls at full concurrency')
+
+    def success_rate(self):
+        if not self.outcomes:
+            return 1.0
+        return self.outcomes.count('ok') / len(self.outcomes)
+
+    def status(self):
+        total = len(self.outcomes)
+        p95 = self.p95()
+        return {
+            'limit': self.limit,
+            'min': self.minimum,
+            'max': self.maximum,
+            'p95_seconds': round(p95, 2) if p95 is not None else None,
+            'baseline_p95_seconds': round(self.baseline_p95, 2) if self.baseline_p95 is not None else None,
+            'success_rate': round(self.success_rate(), 3) if total else None,
+            'recent_decisions': list(self.decisions),
+        }
+
+
+def _classify_error(error):
+    """Map an exception from the Gemini SDK to an AIMD outcome"""
+    code = getattr(error, 'code', None) if isinstance(error, errors.APIError) else None
+    if code == 429:
+        return 'throttled'
+    if isinstance(code, int) and code >= 500:
+        return 'server_error'
+    return 'error'
+
+
+class TokenBucketLimiter:
+    """
+    Process-wide token bucket with a concurrency cap and priority lanes.
+
+    Lives on the shared event loop, so it needs no locks. Waiters are served
+    by priority, then FIFO. The concurrency cap is the AIMD controller's
+    current limit; book requests may not use the last PREVIEW_RESERVED_SLOTS
+    of it (but always get at least one slot).
+    """
+
+    def __init__(self, requests_per_minute, controller, preview_reserved):
+        self.rate = max(requests_per_minute, 0.1) / 60.0  # tokens per second
+        self.capacity = max(1.0, float(controller.maximum))  # burst size
+        self.tokens = self.capacity
+        self.controller = controller
+        self.preview_reserved = max(0, preview_reserved)
+        self.in_flight = 0
+        self._updated = time.monotonic()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._timer = None
+        self.granted = {PRIORITY_PREVIEW: 0, PRIORITY_BOOK: 0}
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _slot_limit(self, priority):
+        if priority == PRIORITY_PREVIEW:
+            return self.controller.limit
+        return max(1, self.controller.limit - self.preview_reserved)
+
+    def _dispatch(self):
+        self._timer = None
+        self._refill()
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():  # caller was cancelled
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= self._slot_limit(priority) or self.tokens < 1:
+                break
+            heapq.heappop(self._waiters)
+            self.tokens -= 1
+            self.in_flight += 1
+            self.granted[priority] += 1
+            future.set_result(None)
+
+        # Out of tokens: wake up when the next one has been refilled
+        if self._waiters and self.tokens < 1 and self._timer is None:
+            delay = (1 - self.tokens) / self.rate
+            self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    async def acquire(self, priority=PRIORITY_BOOK):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._dispatch()
+        await future
+
+    def release(self, priority, latency, outcome):
+        saturated = self.in_flight >= self._slot_limit(priority)
+        self.in_flight -= 1
+        self.controller.record(latency, outcome, saturated)
+        if outcome == 'throttled':
+            # Quota exhausted upstream: stop issuing until the bucket refills
+            self.tokens = min(self.tokens, 0.0)
+        self._dispatch()
+
+    def status(self):
+        self._refill()
+        return {
+            'requests_per_minute': round(self.rate * 60, 1),
+            'max_concurrency': self.controller.limit,
+            'preview_reserved_slots': self.preview_reserved,
+            'in_flight': self.in_flight,
+            'tokens': round(self.tokens, 2),
+            'waiting': sum(1 for _, _, f in self._waiters if not f.done()),
+            'granted': {'preview': self.granted[PRIORITY_PREVIEW], 'book': self.granted[PRIORITY_BOOK]},
+            'concurrency': self.controller.status(),
+        }
+
+
+# ---------------------------------------------------------------------------
+# Shared event loop – sync callers (Flask routes, queue threads) submit to it
+# ---------------------------------------------------------------------------
+
+_loop = None
+_limiter = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop():
+    """Start the shared event loop thread on first use"""
+    global _loop, _limiter
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            controller = AimdController(INITIAL_CONCURRENCY, MIN_CONCURRENCY, MAX_CONCURRENCY)
+            _limiter = TokenBucketLimiter(REQUESTS_PER_MINUTE, controller, PREVIEW_RESERVED_SLOTS)
+            threading.Thread(target=loop.run_forever, daemon=True, name='gemini-loop').start()
+            _loop = loop
+    return _loop
+
+
+def run(coro):
+    """Run a coroutine on the shared loop from synchronous code and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+def _extract_image_bytes(response):
+    """Encoded image bytes from the first inline-data part of a Gemini response"""
+    for part in response.candidates[0].content.parts:
+        if part.inline_data is not None:
+            return part.inline_data.data
+    return None
+
+
+def image_mime_type(data):
+    """MIME type of encoded image bytes (Gemini returns PNG, stored previews may be JPEG)"""
+    if data[:3] == b'\xff\xd8\xff':
+        return 'image/jpeg'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/png'
+
+
+async def _generate_content(contents, priority):
+    await _limiter.acquire(priority)
+    started = time.monotonic()
+    outcome = 'error'
+    try:
+        response = await client.aio.models.generate_content(model=IMAGE_MODEL, contents=contents)
+        outcome = 'ok'
+    except Exception as e:
+        outcome = _classify_error(e)
+        raise
+    finally:
+        _limiter.release(priority, time.monotonic() - started, outcome)
+    return _extract_image_bytes(response)
+
+
+async def generate(prompt, priority=PRIORITY_BOOK):
+    """Generate an image from a text prompt. Returns encoded image bytes or None."""
+    return await _generate_content([prompt], priority)
+
+
+async def color(prompt, image_data, priority=PRIORITY_BOOK):
+    """Color an existing image (encoded bytes, sent without decoding). Returns encoded image bytes or None."""
+    part = types.Part.from_bytes(data=image_data, mime_type=image_mime_type(image_data))
+    return await _generate_content([prompt, part], priority)
+
+
+def get_limiter_status():
+    """Current rate limiter state for monitoring"""
+    _get_loop()
+    return asyncio.run_coroutine_threadsafe(_status(), _loop).result()
+
+
+async def _status():
+    return _limiter.status()
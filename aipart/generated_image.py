@@ -2,12 +2,12 @@ from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
 import os
 import re
-from datetime import datetime
+import hashlib
+import threading
 import base64
-from google import genai
-from google.genai import types
 from dotenv import load_dotenv
 import io
+from PIL import Image
 from payment import payment_bp  # Import payment blueprint
 
 # Load environment variables
@@ -37,6 +37,13 @@ from generation_queue import start_queue_worker
 start_queue_worker()
 print("✅ Generation queue worker initialized")
 
+# Previews can render in the background (see /api/generate)
+from preview_jobs import submit_preview, get_preview_job, get_preview_status, PreviewQueueFull
+
+# Bounded retention for generated_images/ and generated_pdfs/
+from janitor import start_janitor
+start_janitor()
+
 # Configure upload folder
 UPLOAD_FOLDER = 'generated_images'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -44,12 +51,29 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Previews are stored under a name derived from their content, so a preview
+# URL never changes meaning and may be cached for good. Browsers that accept
+# AVIF or WebP get a copy transcoded once and kept next to the PNG (AVIF only
+# with a Pillow that can write it).
+PREVIEW_CACHE_SECONDS = 365 * 24 * 3600
+Image.init()
+PREVIEW_ENCODINGS = [
+    (mimetype, fmt, ext, quality)
+    for mimetype, fmt, ext, quality in [
+        ('image/avif', 'AVIF', 'avif', 60),
+        ('image/webp', 'WEBP', 'webp', 80),
+    ]
+    if fmt in Image.SAVE
+]
+
 # Google Imagen API configuration from environment variable
 API_KEY = os.getenv('GOOGLE_API_KEY')
 if not API_KEY:
     raise ValueError("GOOGLE_API_KEY not found in environment variables. Please check your .env file.")
 
-client = genai.Client(api_key=API_KEY)
+import gemini_client
+import janitor
+import preview_cache
 
 # Allowed values for validated fields
 _ALLOWED_TOPICS = {'Ghibli', 'Cartoon', 'Minimal', 'Comic', 'Detailed', 'Magical'}
@@ -140,18 +164,16 @@ def generate_image_api(prompt):
     
     try:
         print("🎨 Generating with Gemini 2.5 Flash Image...")
-        response = client.models.generate_content(
-            model='gemini-2.5-flash-image',
-            contents=[prompt]
+        # Shared client: previews take the priority lane ahead of queued book pages
+        image_data = gemini_client.run(
+            gemini_client.generate(prompt, priority=gemini_client.PRIORITY_PREVIEW)
         )
-        
-        # Extract image from response parts
-        for part in response.candidates[0].content.parts:
-            if part.inline_data is not None:
-                print("✅ Image generated successfully with Gemini 2.5 Flash Image!")
-                # Return the raw image bytes
-                return part.inline_data.data
-        
+
+        if image_data:
+            print("✅ Image generated successfully with Gemini 2.5 Flash Image!")
+            # Return the raw image bytes
+            return image_data
+
         print("❌ No image found in response")
         return None
     
@@ -167,8 +189,88 @@ def health():
     """Health check endpoint"""
     return jsonify({'status': 'ok', 'message': 'Hera AI Backend is running'})
 
+def _render_preview(params):
+    """Generate a preview page, store it and return the response payload (None on failure)"""
+    print(f"Received params: {params}")
+    
+    # Build the prompt
+    prompt = build_prompt(params)
+    print(f"Generated prompt: {prompt}")
+    
+    # Generate image using Google Imagen API – identical requests share one render
+    image_data = preview_cache.get_or_generate(
+        preview_cache.cache_key(params, prompt),
+        lambda: generate_image_api(prompt),
+        fresh=bool(params.get('fresh')),
+    )
+    
+    if image_data is None:
+        return None
+    
+    filename = _store_preview(image_data)
+    result = {
+        'success': True,
+        'prompt': prompt,
+        'image_url': f'/api/preview/{filename}',
+        'filename': filename
+    }
+    if params.get('inline'):
+        # Opt-in: the image itself as base64 inside the JSON (~33% larger, uncacheable)
+        image_base64 = base64.b64encode(image_data).decode('utf-8')
+        result['image'] = f'data:image/png;base64,{image_base64}'
+    return result
+
+def _store_preview(image_data):
+    """Save a preview under its content hash (coloring_page_<32 hex>.png) and return the file name"""
+    digest = hashlib.sha256(image_data).hexdigest()[:32]
+    filename = f'coloring_page_{digest}.png'
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if not os.path.exists(filepath):
+        # Write-then-rename: identical concurrent previews end up as the same complete file
+        tmp_path = f'{filepath}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(image_data)
+        os.replace(tmp_path, filepath)
+    janitor.track(filepath)
+    return filename
+
+def _preview_encoding(filepath):
+    """
+    Path, mimetype and ETag of the best representation of a stored preview
+    for this request's Accept header. A transcoded copy is written on first
+    request and reused afterwards; it is only served if smaller than the PNG.
+    """
+    digest = os.path.basename(filepath)[len('coloring_page_'):-len('.png')]
+    accepted = {value for value, quality in request.accept_mimetypes if quality > 0}
+    for mimetype, fmt, ext, quality in PREVIEW_ENCODINGS:
+        if mimetype not in accepted:
+            continue
+        encoded_path = f'{os.path.splitext(filepath)[0]}.{ext}'
+        if not os.path.exists(encoded_path):
+            try:
+                with Image.open(filepath) as img:
+                    img = img.convert('RGB') if img.mode not in ('RGB', 'L') else img
+                    tmp_path = f'{encoded_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+                    img.save(tmp_path, format=fmt, quality=quality)
+                os.replace(tmp_path, encoded_path)
+                janitor.track(encoded_path)
+            except OSError as e:
+                print(f"⚠️ Could not transcode preview to {fmt}: {e}")
+                continue
+        if os.path.getsize(encoded_path) >= os.path.getsize(filepath):
+            continue  # flat line art can compress better as PNG
+        return encoded_path, mimetype, f'{digest}.{ext}'
+    return filepath, 'image/png', digest
+
 @app.route('/api/generate', methods=['POST'])
 def generate():
+    """
+    Generate a preview page.
+    With {"async": true} in the body the render runs on the preview pool and
+    the response is 202 with a job_id to poll at /api/generate/<job_id>;
+    otherwise the request waits for the image. Identical requests reuse a
+    cached render unless {"fresh": true} asks for a new image.
+    """
     try:
         params = request.json
 
@@ -177,35 +279,22 @@ def generate():
         if error_msg:
             return jsonify({'error': error_msg}), status_code
 
-        print(f"Received params: {params}")
-        
-        # Build the prompt
-        prompt = build_prompt(params)
-        print(f"Generated prompt: {prompt}")
-        
-        # Generate image using Google Imagen API
-        image_data = generate_image_api(prompt)
-        
-        if image_data is None:
+        if params.get('async'):
+            try:
+                job_id = submit_preview(_render_preview, params)
+            except PreviewQueueFull:
+                return jsonify({'error': 'Too many previews in progress. Please try again shortly.'}), 503
+            return jsonify({
+                'success': True,
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': f'/api/generate/{job_id}'
+            }), 202
+
+        result = _render_preview(params)
+        if result is None:
             return jsonify({'error': 'Failed to generate image'}), 500
-        
-        # Save the image
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'coloring_page_{timestamp}.png'
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        
-        with open(filepath, 'wb') as f:
-            f.write(image_data)
-        
-        # Convert to base64 for display
-        image_base64 = base64.b64encode(image_data).decode('utf-8')
-        
-        return jsonify({
-            'success': True,
-            'prompt': prompt,
-            'image': f'data:image/png;base64,{image_base64}',
-            'filename': filename
-        })
+        return jsonify(result)
     
     except Exception as e:
         print(f"Error in generate: {str(e)}")
@@ -213,6 +302,42 @@ def generate():
         traceback.print_exc()
         return jsonify({'error': 'Image generation failed. Please try again.'}), 500
 
+@app.route('/api/generate/<job_id>', methods=['GET'])
+def generate_result(job_id):
+    """Status of an async preview job; the preview itself once it is done"""
+    job = get_preview_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown or expired preview job'}), 404
+    if job['state'] == 'done':
+        return jsonify({**job['result'], 'status': 'done'})
+    if job['state'] == 'failed':
+        return jsonify({'success': False, 'status': 'failed', 'error': job['error']}), 500
+    return jsonify({'success': True, 'status': job['state']}), 202
+
+@app.route('/api/preview/<filename>', methods=['GET'])
+def preview(filename):
+    """
+    Serve a stored preview by its content-addressed name.
+    The bytes behind a name never change, so the response carries a strong
+    ETag and may be cached for a year without revalidating; AVIF/WebP are
+    negotiated through Accept (Vary: Accept).
+    """
+    from book_generator import is_valid_preview_filename
+
+    if not is_valid_preview_filename(filename):
+        return jsonify({'success': False, 'error': 'Preview not found'}), 404
+
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    janitor.touch(filepath)
+    path, mimetype, etag = _preview_encoding(filepath)
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=etag,
+                         max_age=PREVIEW_CACHE_SECONDS)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept')
+    return response
+
 @app.route('/api/download/<filename>')
 def download(filename):
     """Download generated image"""
@@ -223,10 +348,17 @@ def download(filename):
 def queue_status():
     """Get current generation queue status"""
     from generation_queue import get_queue_status
+    from pdf_generator import get_codec_stats
+    from gemini_client import get_limiter_status
     status = get_queue_status()
     return jsonify({
         'success': True,
-        'queue': status
+        'queue': status,
+        'previews': get_preview_status(),
+        'preview_cache': preview_cache.get_cache_stats(),
+        'storage': janitor.get_janitor_status(),
+        'codec': get_codec_stats(),
+        'gemini': get_limiter_status()
     })
 
 if __name__ == '__main__':
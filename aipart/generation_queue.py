@@ -1,118 +1,390 @@
 """
 Queue system to prevent memory overload on Render
-Allows only 1 book generation at a time
+Runs up to GENERATION_WORKERS books at a time; a job is admitted only when
+current RSS plus its estimated footprint fits GENERATION_MEMORY_BUDGET_MB.
+Jobs are persisted in job_store so waiting and in-flight orders survive restarts.
 """
+import os
+import resource
 import threading
-from queue import Queue
+import time
+from collections import OrderedDict
+from queue import Queue, Full
 from datetime import datetime
+import job_store
+
+# Worker slots and memory budget (Render free tier has 512 MB)
+MAX_WORKERS = int(os.getenv('GENERATION_WORKERS', 2))
+MEMORY_BUDGET_MB = float(os.getenv('GENERATION_MEMORY_BUDGET_MB', 450))
+
+# Per-job footprint estimate: fixed overhead + per PDF page (colored pages weigh more)
+JOB_BASE_MB = float(os.getenv('GENERATION_JOB_BASE_MB', 60))
+JOB_PAGE_MB = float(os.getenv('GENERATION_JOB_PAGE_MB', 2))
+COLORED_PAGE_FACTOR = 1.5
+
+# How often a waiting job re-checks RSS when nothing finishes (seconds)
+ADMISSION_POLL_SECONDS = 5
+
+# A job that has already used this many attempts (across restarts) is not recovered
+MAX_JOB_ATTEMPTS = int(os.getenv('GENERATION_MAX_JOB_ATTEMPTS', 4))
+
+# Finished sessions stay in the status index this long (seconds)
+SESSION_INDEX_TTL_SECONDS = int(os.getenv('GENERATION_STATUS_TTL_SECONDS', 24 * 3600))
 
 # Global queue for book generation jobs
 generation_queue = Queue()
-is_processing = threading.Lock()
-current_job = None
+
+# Per-session state index: session_id -> {'state', 'seq', ...}. States move
+# queued → generating → completed | failed. Jobs are numbered in enqueue
+# order and leave the queue in that order, so a queued job's position is
+# its seq minus the seq of the last job that started: O(1) per lookup.
+_index_lock = threading.Lock()
+_session_index = OrderedDict()
+_enqueue_seq = 0
+_started_seq = 0
+
+# Live listeners (e.g. SSE streams): session_id -> set of Queues that receive
+# every state change and page of that session's job, guarded by _index_lock
+_subscribers = {}
+SUBSCRIBER_QUEUE_SIZE = 256
+
+# Admission state: running jobs and their reserved memory, guarded by _slots
+_slots = threading.Condition()
+_running = {}
+_reserved_mb = 0.0
+_idle_rss_mb = 0.0
+
+
+def _current_rss_mb():
+    """Resident set size of this process in MB"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        # Non-Linux fallback: peak RSS (KB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if peak > 1 << 30 else peak / 1024
+
+
+def estimate_job_memory_mb(session_data):
+    """Estimate the peak memory a book job adds, from its page count and book type"""
+    metadata = session_data.get('metadata', {}) or {}
+    try:
+        pages = int(metadata.get('pages', 24))
+    except (TypeError, ValueError):
+        pages = 24
+    per_page = JOB_PAGE_MB
+    if metadata.get('bookType', 'blackwhite') != 'blackwhite':
+        per_page *= COLORED_PAGE_FACTOR
+    return JOB_BASE_MB + pages * per_page
+
+
+def _admit(job):
+    """
+    Block until the job gets a worker slot and fits in the memory budget.
+
+    Projected usage is the larger of the measured RSS and the idle RSS plus
+    what running jobs reserved (they may not have grown yet), plus this job's
+    estimate. A job is always admitted when nothing else is running so an
+    oversized book can never stall the queue.
+    """
+    global _reserved_mb, _idle_rss_mb
+
+    estimate = estimate_job_memory_mb(job['session'])
+    with _slots:
+        while True:
+            rss = _current_rss_mb()
+            if not _running:
+                _idle_rss_mb = rss
+                break
+            if len(_running) < MAX_WORKERS:
+                projected = max(rss, _idle_rss_mb + _reserved_mb) + estimate
+                if projected <= MEMORY_BUDGET_MB:
+                    break
+            _slots.wait(timeout=ADMISSION_POLL_SECONDS)
+
+        _running[job['id']] = {'job': job, 'reserved_mb': estimate, 'started': datetime.now()}
+        _reserved_mb += estimate
+        busy = len(_running)
+
+    global _started_seq
+    with _index_lock:
+        _started_seq = max(_started_seq, job['seq'])
+    _index_update(job['id'], 'generating')
+
+    job_store.update_job(job['id'], status='running')
+    print(f"🎟️  Job {job['id']} admitted (~{estimate:.0f} MB, RSS {rss:.0f}/{MEMORY_BUDGET_MB:.0f} MB, "
+          f"{busy}/{MAX_WORKERS} slots busy)")
+
+
+def _index_enqueue(job):
+    """Number the job and mark its session queued, then put it on the queue (atomically)"""
+    global _enqueue_seq
+    with _index_lock:
+        _enqueue_seq += 1
+        job['seq'] = _enqueue_seq
+        _session_index[job['id']] = {'state': 'queued', 'seq': job['seq'], 'updated_at': time.time()}
+        _session_index.move_to_end(job['id'])
+        generation_queue.put(job)
+        _publish(job['id'], 'queued')
+
+
+def _index_update(job_id, state, **details):
+    """Move a session to a new state; finished sessions age out after SESSION_INDEX_TTL_SECONDS"""
+    now = time.time()
+    with _index_lock:
+        entry = _session_index.setdefault(job_id, {'seq': 0})
+        entry.update(details, state=state, updated_at=now)
+        _session_index.move_to_end(job_id)
+        _publish(job_id, state)
+
+        # Oldest-updated entries sit at the front: drop expired finished ones
+        while _session_index:
+            oldest_id, oldest = next(iter(_session_index.items()))
+            if oldest['state'] not in ('completed', 'failed') or now - oldest['updated_at'] < SESSION_INDEX_TTL_SECONDS:
+                break
+            del _session_index[oldest_id]
+
+
+def _publish(job_id, event):
+    """Push the session's current state to its listeners as `event` (caller holds _index_lock)"""
+    listeners = _subscribers.get(job_id)
+    if not listeners:
+        return
+    state = dict(_session_index[job_id])
+    if state['state'] == 'queued':
+        state['queue_position'] = max(1, state['seq'] - _started_seq)
+    for listener in listeners:
+        try:
+            listener.put_nowait((event, state))
+        except Full:
+            pass  # a stalled listener misses events; its next state snapshot catches up
+
+
+def report_progress(job_id, pages_done, pages_total):
+    """Record that a job has finished pages_done of pages_total pages and tell its listeners"""
+    with _index_lock:
+        entry = _session_index.get(job_id)
+        if entry is None:
+            return
+        entry.update(pages_done=pages_done, pages_total=pages_total, updated_at=time.time())
+        _publish(job_id, 'page')
+
+
+def subscribe(session_id):
+    """
+    Queue receiving (event, state) tuples for a session's job: 'queued',
+    'generating', 'page', 'completed' and 'failed'. Call unsubscribe() with
+    it when done.
+    """
+    listener = Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    with _index_lock:
+        _subscribers.setdefault(session_id, set()).add(listener)
+    return listener
+
+
+def unsubscribe(session_id, listener):
+    with _index_lock:
+        listeners = _subscribers.get(session_id)
+        if listeners:
+            listeners.discard(listener)
+            if not listeners:
+                del _subscribers[session_id]
+
+
+def get_session_state(session_id):
+    """
+    O(1) state of a session's job, or None if this process does not know it.
+    Queued sessions include their real 1-based queue position.
+    """
+    with _index_lock:
+        entry = _session_index.get(session_id)
+        if entry is None:
+            return None
+        state = dict(entry)
+        if state['state'] == 'queued':
+            state['queue_position'] = max(1, state['seq'] - _started_seq)
+    return state
+
+
+def _release(job):
+    """Free the job's worker slot and memory reservation"""
+    global _reserved_mb
+
+    with _slots:
+        entry = _running.pop(job['id'], None)
+        if entry:
+            _reserved_mb = max(0.0, _reserved_mb - entry['reserved_mb'])
+        _slots.notify_all()
+
 
 def add_to_queue(session_data):
-    """Add a generation job to the queue"""
-    job_id = session_data.get('id', datetime.now().strftime('%Y%m%d_%H%M%S'))
-    
+    """Persist a generation job and add it to the queue"""
+    session_record = job_store.compact_session(session_data)
+    job_id = session_record['id'] or datetime.now().strftime('%Y%m%d_%H%M%S')
+    session_record['id'] = job_id
+
     print(f"\n📥 Adding job {job_id} to queue")
     print(f"   Queue size before: {generation_queue.qsize()}")
-    
-    generation_queue.put({
+
+    if not job_store.insert_job(job_id, session_record):
+        print(f"   ⚠️ Job {job_id} already recorded (duplicate webhook?) – not queued again")
+        return job_id
+
+    _index_enqueue({
         'id': job_id,
-        'session': session_data,
+        'session': session_record,
         'timestamp': datetime.now()
     })
-    
+
     print(f"   Queue size after: {generation_queue.qsize()}")
     return job_id
 
+
+def recover_jobs():
+    """Re-enqueue jobs that were waiting or in flight when the process stopped"""
+    recovered = 0
+    for record in job_store.load_unfinished_jobs():
+        if get_session_state(record['id']) is not None:
+            continue  # already queued by this process
+        if record['attempts'] >= MAX_JOB_ATTEMPTS:
+            print(f"❌ Job {record['id']} used {record['attempts']} attempts – not recovering")
+            job_store.update_job(record['id'], status='failed')
+            _index_update(record['id'], 'failed')
+            _notify_failure(record['session'])
+            continue
+        job_store.update_job(record['id'], status='queued')
+        _index_enqueue({
+            'id': record['id'],
+            'session': record['session'],
+            'timestamp': datetime.fromisoformat(record['created_at'])
+        })
+        recovered += 1
+    if recovered:
+        print(f"♻️  Recovered {recovered} unfinished job(s) from {job_store.JOB_DB_FILE}")
+    return recovered
+
+
+def _notify_failure(session):
+    """Tell the customer their book could not be generated"""
+    try:
+        from email_service import send_generation_failed
+        customer_email = (session.get('customer_details') or {}).get('email')
+        if customer_email:
+            send_generation_failed(customer_email)
+            print(f"📧 Failure notification sent to {customer_email}")
+        else:
+            print("⚠️ No customer email found — could not send failure notification")
+    except Exception as notify_err:
+        print(f"⚠️ Failed to send failure notification: {str(notify_err)}")
+
+
+def _run_job(job):
+    """Generate one book in its own worker slot"""
+    try:
+        print(f"\n{'='*60}")
+        print(f"🔄 Processing job {job['id']}")
+        print(f"   Queued at: {job['timestamp']}")
+        print(f"   Jobs remaining in queue: {generation_queue.qsize()}")
+        print(f"{'='*60}\n")
+
+        # Import here to avoid circular imports
+        from book_generator import generate_complete_book
+
+        # Generate the book with 1 retry on failure. Pages are checkpointed per
+        # job, so a retry only regenerates the pages that are still missing;
+        # the last attempt accepts a book with some pages skipped.
+        pdf_path = None
+        for attempt in range(2):
+            job_store.update_job(job['id'], add_attempt=True)
+            try:
+                pdf_path = generate_complete_book(
+                    job['session'], preview_image_base64=None,
+                    job_id=job['id'], allow_partial=(attempt == 1),
+                    on_progress=lambda done, total: report_progress(job['id'], done, total),
+                )
+                if pdf_path:
+                    break
+                print(f"⚠️ Attempt {attempt + 1} returned no PDF, {'retrying...' if attempt == 0 else 'giving up.'}")
+            except Exception as attempt_err:
+                print(f"⚠️ Attempt {attempt + 1} raised error: {str(attempt_err)}")
+                if attempt == 1:
+                    import traceback
+                    traceback.print_exc()
+
+        if pdf_path:
+            print(f"✅ Job {job['id']} completed successfully")
+            job_store.update_job(job['id'], status='completed')
+            _index_update(job['id'], 'completed', pdf_filename=os.path.basename(pdf_path))
+
+            # Register the session with the PDF
+            try:
+                from session_manager import register_session
+
+                session = job['session']
+                session_id = session['id']
+                pdf_filename = os.path.basename(pdf_path)
+                customer_email = (session.get('customer_details') or {}).get('email')
+
+                register_session(session_id, pdf_filename, customer_email)
+                print(f"✅ Session {session_id} registered with PDF {pdf_filename}")
+            except Exception as e:
+                print(f"⚠️ Failed to register session: {str(e)}")
+        else:
+            print(f"❌ Job {job['id']} failed after all attempts — notifying customer")
+            job_store.update_job(job['id'], status='failed')
+            _index_update(job['id'], 'failed')
+            _notify_failure(job['session'])
+
+    except Exception as e:
+        print(f"❌ Error processing job: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        job_store.update_job(job['id'], status='failed')
+        _index_update(job['id'], 'failed')
+    finally:
+        _release(job)
+        generation_queue.task_done()
+
+
 def process_queue():
-    """Process jobs one at a time from the queue"""
-    global current_job
-    
+    """Dispatch queued jobs (FIFO) to worker slots as memory allows"""
     while True:
         try:
-            # Wait for a job (blocking)
+            # Wait for a job (blocking), then for a slot that fits it
             job = generation_queue.get()
-            
-            with is_processing:
-                current_job = job
-                
-                print(f"\n{'='*60}")
-                print(f"🔄 Processing job {job['id']}")
-                print(f"   Queued at: {job['timestamp']}")
-                print(f"   Jobs remaining in queue: {generation_queue.qsize()}")
-                print(f"{'='*60}\n")
-                
-                # Import here to avoid circular imports
-                from book_generator import generate_complete_book
-
-                # Generate the book with 1 retry on failure
-                pdf_path = None
-                for attempt in range(2):
-                    try:
-                        pdf_path = generate_complete_book(job['session'], preview_image_base64=None)
-                        if pdf_path:
-                            break
-                        print(f"⚠️ Attempt {attempt + 1} returned no PDF, {'retrying...' if attempt == 0 else 'giving up.'}")
-                    except Exception as attempt_err:
-                        print(f"⚠️ Attempt {attempt + 1} raised error: {str(attempt_err)}")
-                        if attempt == 1:
-                            import traceback
-                            traceback.print_exc()
-                
-                if pdf_path:
-                    print(f"✅ Job {job['id']} completed successfully")
-                    
-                    # Register the session with the PDF
-                    try:
-                        from session_manager import register_session
-                        import os
-                        
-                        session = job['session']
-                        session_id = session.id
-                        pdf_filename = os.path.basename(pdf_path)
-                        customer_email = session.customer_details.email if session.customer_details else None
-                        
-                        register_session(session_id, pdf_filename, customer_email)
-                        print(f"✅ Session {session_id} registered with PDF {pdf_filename}")
-                    except Exception as e:
-                        print(f"⚠️ Failed to register session: {str(e)}")
-                else:
-                    print(f"❌ Job {job['id']} failed after all attempts — notifying customer")
-                    try:
-                        from email_service import send_generation_failed
-                        session = job['session']
-                        customer_email = session.customer_details.email if hasattr(session, 'customer_details') and session.customer_details else None
-                        if customer_email:
-                            send_generation_failed(customer_email)
-                            print(f"📧 Failure notification sent to {customer_email}")
-                        else:
-                            print("⚠️ No customer email found — could not send failure notification")
-                    except Exception as notify_err:
-                        print(f"⚠️ Failed to send failure notification: {str(notify_err)}")
-                
-                current_job = None
-                generation_queue.task_done()
-                
+            _admit(job)
+            threading.Thread(target=_run_job, args=(job,), daemon=True,
+                             name=f"generation-{job['id']}").start()
         except Exception as e:
-            print(f"❌ Error processing job: {str(e)}")
+            print(f"❌ Error dispatching job: {str(e)}")
             import traceback
             traceback.print_exc()
-            current_job = None
-            generation_queue.task_done()
+
 
 def start_queue_worker():
-    """Start the queue processing worker thread"""
-    worker = threading.Thread(target=process_queue, daemon=True)
+    """Recover persisted jobs, then start the queue dispatcher thread"""
+    recover_jobs()
+    worker = threading.Thread(target=process_queue, daemon=True, name='generation-dispatcher')
     worker.start()
-    print("✅ Queue worker started")
+    print(f"✅ Queue worker started ({MAX_WORKERS} slots, {MEMORY_BUDGET_MB:.0f} MB budget)")
+
 
 def get_queue_status():
     """Get current queue status"""
+    with _slots:
+        running = list(_running)
+        reserved = _reserved_mb
     return {
         'queue_size': generation_queue.qsize(),
-        'is_processing': current_job is not None,
-        'current_job': current_job['id'] if current_job else None
+        'is_processing': bool(running),
+        'current_job': running[0] if running else None,
+        'running_jobs': running,
+        'workers': MAX_WORKERS,
+        'memory': {
+            'rss_mb': round(_current_rss_mb(), 1),
+            'reserved_mb': round(reserved, 1),
+            'budget_mb': MEMORY_BUDGET_MB,
+        },
     }
@@ -0,0 +1,362 @@
+"""
+Storage janitor - bounded retention for generated_images/ and generated_pdfs/
+Previews, books and their derived files are grouped into units (a preview
+with its WebP/AVIF copies; a book with its variants and thumbnails) and kept
+in a per-folder LRU index ordered by last access. Serving endpoints and
+writers report accesses and new files (touch / track), so a pass only walks
+the least-recently-used end of each index: units past the folder's age limit,
+or beyond its byte cap, are deleted until the folder fits again. The folders
+are rescanned from disk once at start and then every JANITOR_RESCAN_HOURS.
+
+Never deleted: books the session mapping still links to (it is pruned with
+session_manager.clean_old_sessions first), previews of unfinished jobs, and
+anything written or accessed within JANITOR_MIN_AGE_MINUTES.
+"""
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+JANITOR_INTERVAL_SECONDS = int(os.getenv('JANITOR_INTERVAL_SECONDS', 600))
+JANITOR_RESCAN_HOURS = float(os.getenv('JANITOR_RESCAN_HOURS', 24))
+JANITOR_MIN_AGE_SECONDS = float(os.getenv('JANITOR_MIN_AGE_MINUTES', 60)) * 60
+SESSION_RETENTION_DAYS = int(os.getenv('SESSION_RETENTION_DAYS', 7))
+
+# Per folder: byte cap and age limit (since last access)
+PREVIEW_MAX_BYTES = int(float(os.getenv('PREVIEW_FOLDER_MAX_MB', 500)) * 1024 * 1024)
+PREVIEW_MAX_AGE_SECONDS = float(os.getenv('PREVIEW_MAX_AGE_HOURS', 72)) * 3600
+PDF_MAX_BYTES = int(float(os.getenv('PDF_FOLDER_MAX_MB', 2000)) * 1024 * 1024)
+PDF_MAX_AGE_SECONDS = float(os.getenv('PDF_MAX_AGE_DAYS', SESSION_RETENTION_DAYS)) * 86400
+# Checkpoints of jobs that are no longer queued or running
+CHECKPOINT_MAX_AGE_SECONDS = float(os.getenv('CHECKPOINT_MAX_AGE_DAYS', 2)) * 86400
+
+PREVIEW_SUFFIXES = ('.png', '.webp', '.avif')
+
+_lock = threading.Lock()
+_folders = {}  # folder path -> _FolderIndex, filled by start_janitor()
+_checkpoint_folder = None
+_last_rescan = 0.0
+_stats = {'passes': 0, 'deleted_units': 0, 'deleted_bytes': 0, 'sessions_pruned': 0,
+          'checkpoints_deleted': 0, 'last_pass': None, 'over_cap': []}
+
+
+class _FolderIndex:
+    """
+    LRU index of one folder's units: key -> {'members': {name: bytes}, 'accessed': ts}.
+    Least recently accessed units sit at the front.
+    """
+
+    def __init__(self, kind, path, max_bytes, max_age, unit_key, members_of):
+        self.kind = kind
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.unit_key = unit_key      # file name -> unit key (None = not managed)
+        self.members_of = members_of  # unit key -> candidate member names
+        self.units = OrderedDict()
+        self.bytes = 0
+
+    def _set_member(self, key, name, size, accessed):
+        unit = self.units.get(key)
+        if unit is None:
+            unit = self.units[key] = {'members': {}, 'accessed': accessed}
+        self.bytes += size - unit['members'].get(name, 0)
+        unit['members'][name] = size
+        unit['accessed'] = max(unit['accessed'], accessed)
+
+    def remove(self, key):
+        unit = self.units.pop(key, None)
+        if unit:
+            self.bytes -= sum(unit['members'].values())
+        return unit
+
+
+def _entry_size(path):
+    """Bytes of a file, or of every file below a directory"""
+    if os.path.isdir(path):
+        total = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+    return os.path.getsize(path)
+
+
+# ── unit naming ──────────────────────────────────────────────────────────
+
+def _preview_key(name):
+    """coloring_page_<id>.png/.webp/.avif → coloring_page_<id>; other files are their own unit"""
+    if name.endswith('.tmp'):
+        return None  # being written
+    stem, ext = os.path.splitext(name)
+    if name.startswith('coloring_page_') and ext in PREVIEW_SUFFIXES:
+        return stem
+    return name
+
+
+def _preview_members(key):
+    return [key + ext for ext in PREVIEW_SUFFIXES] if key.startswith('coloring_page_') else [key]
+
+
+def _book_key(name):
+    """<book>.pdf, <book>_<variant>.pdf and <book>_thumbs → <book>"""
+    from pdf_generator import OUTPUT_PROFILES, PRIMARY_VARIANT
+
+    if name.endswith('.tmp'):
+        return None
+    if name.endswith('_thumbs'):
+        return name[:-len('_thumbs')]
+    stem, ext = os.path.splitext(name)
+    if ext != '.pdf':
+        return name
+    for variant in OUTPUT_PROFILES:
+        if variant != PRIMARY_VARIANT and stem.endswith(f'_{variant}'):
+            return stem[:-len(variant) - 1]
+    return stem
+
+
+def _book_members(key):
+    from pdf_generator import OUTPUT_PROFILES, thumbnail_dir, variant_path
+
+    pdf_name = f'{key}.pdf'
+    names = [os.path.basename(variant_path(pdf_name, variant)) for variant in OUTPUT_PROFILES]
+    return names + [os.path.basename(thumbnail_dir(pdf_name)), key]
+
+
+# ── index maintenance ────────────────────────────────────────────────────
+
+def _index_for(path):
+    return _folders.get(os.path.dirname(os.path.abspath(path)))
+
+
+def track(path):
+    """Record a new or rewritten file (or thumbnail folder) in its folder's index as just accessed"""
+    with _lock:
+        index = _index_for(path)
+        if index is None:
+            return
+        name = os.path.basename(path)
+        key = index.unit_key(name)
+        if key is None:
+            return
+        try:
+            size = _entry_size(path)
+        except OSError:
+            return
+        index._set_member(key, name, size, time.time())
+        index.units.move_to_end(key)
+
+
+def touch(path):
+    """Mark the unit a served file belongs to as just accessed (O(1), no disk access)"""
+    with _lock:
+        index = _index_for(path)
+        if index is None:
+            return
+        key = index.unit_key(os.path.basename(path))
+        unit = index.units.get(key)
+        if unit is not None:
+            unit['accessed'] = time.time()
+            index.units.move_to_end(key)
+
+
+def _scan(index):
+    """(mtime, key, name, bytes) of every managed entry in a folder (reads the disk, no lock held)"""
+    entries = []
+    try:
+        with os.scandir(index.path) as it:
+            for entry in it:
+                if entry.path == _checkpoint_folder:
+                    continue
+                key = index.unit_key(entry.name)
+                if key is None:
+                    continue
+                try:
+                    entries.append((entry.stat().st_mtime, key, entry.name, _entry_size(entry.path)))
+                except OSError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def _apply_scan(index, entries):
+    """Rebuild a folder's index from _scan() results, least recently used first (caller holds _lock)"""
+    known = {key: unit['accessed'] for key, unit in index.units.items()}
+    index.units = OrderedDict()
+    index.bytes = 0
+    for mtime, key, name, size in sorted(entries):
+        # Keep access times tracked since the last scan; files only have mtimes
+        index._set_member(key, name, size, max(mtime, known.get(key, 0)))
+    index.units = OrderedDict(sorted(index.units.items(), key=lambda item: item[1]['accessed']))
+
+
+# ── retention pass ───────────────────────────────────────────────────────
+
+def _protected_books():
+    """Books the session mapping links to, after pruning sessions past SESSION_RETENTION_DAYS"""
+    from session_manager import clean_old_sessions, load_sessions
+
+    _stats['sessions_pruned'] += clean_old_sessions(days=SESSION_RETENTION_DAYS)
+    return {
+        _book_key(data['pdf_filename'])
+        for data in load_sessions().values()
+        if data.get('pdf_filename')
+    }
+
+
+def _protected_previews(unfinished):
+    """Previews that queued or running jobs will reuse as page 1"""
+    return {
+        _preview_key(preview)
+        for job in unfinished
+        for preview in [((job['session'] or {}).get('metadata') or {}).get('preview')]
+        if preview
+    }
+
+
+def _select_victims(index, protected, now):
+    """Pop the units to delete from the LRU end of an index (caller holds _lock)"""
+    victims = []
+    remaining = index.bytes
+    for key, unit in list(index.units.items()):
+        idle = now - unit['accessed']
+        if idle < JANITOR_MIN_AGE_SECONDS:
+            break  # everything after this was accessed even more recently
+        if key in protected:
+            continue
+        if idle < index.max_age and remaining <= index.max_bytes:
+            break
+        remaining -= sum(unit['members'].values())
+        victims.append((key, index.remove(key)))
+    return victims
+
+
+def _delete_unit(index, key, unit):
+    """Remove every file of a unit, including members written since it was indexed"""
+    freed = 0
+    for name in set(unit['members']) | set(index.members_of(key)):
+        path = os.path.join(index.path, name)
+        try:
+            freed += _entry_size(path)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            print(f"⚠️ Janitor could not delete {path}: {e}")
+    return freed
+
+
+def _sweep_checkpoints(unfinished_ids, now):
+    """Delete checkpoint folders of jobs that finished or gave up (small folder, rescan cadence)"""
+    from book_generator import _checkpoint_dir
+
+    keep = {os.path.basename(_checkpoint_dir(job_id)) for job_id in unfinished_ids}
+    try:
+        entries = list(os.scandir(_checkpoint_folder))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            stale = now - entry.stat().st_mtime > CHECKPOINT_MAX_AGE_SECONDS
+        except OSError:
+            continue
+        if entry.is_dir() and entry.name not in keep and stale:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            _stats['checkpoints_deleted'] += 1
+
+
+def run_pass():
+    """One retention pass over every folder; returns the number of units deleted"""
+    global _last_rescan
+    import job_store
+
+    now = time.time()
+    rescan = now - _last_rescan >= JANITOR_RESCAN_HOURS * 3600
+    unfinished = job_store.load_unfinished_jobs()
+    protected = {
+        'pdf': _protected_books(),
+        'preview': _protected_previews(unfinished),
+    }
+
+    scans = {path: _scan(index) for path, index in _folders.items()} if rescan else {}
+
+    deletions = []
+    with _lock:
+        for path, entries in scans.items():
+            _apply_scan(_folders[path], entries)
+        if rescan:
+            _last_rescan = now
+        over_cap = []
+        for index in _folders.values():
+            deletions += [(index, key, unit) for key, unit in _select_victims(index, protected[index.kind], now)]
+            if index.bytes > index.max_bytes:
+                over_cap.append(index.kind)
+
+    freed = 0
+    for index, key, unit in deletions:
+        freed += _delete_unit(index, key, unit)
+    if rescan:
+        _sweep_checkpoints([job['id'] for job in unfinished], now)
+
+    _stats['passes'] += 1
+    _stats['deleted_units'] += len(deletions)
+    _stats['deleted_bytes'] += freed
+    _stats['last_pass'] = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(now))
+    _stats['over_cap'] = over_cap
+    if deletions:
+        print(f"🧹 Janitor removed {len(deletions)} item(s), {freed / 1024 / 1024:.1f} MB freed")
+    if over_cap:
+        print(f"⚠️ Janitor: {', '.join(over_cap)} still over its cap (only protected or recent files left)")
+    return len(deletions)
+
+
+def _janitor_loop():
+    while True:
+        try:
+            run_pass()
+        except Exception as e:
+            print(f"❌ Janitor pass failed: {str(e)}")
+            import traceback
+            traceback.print_exc()
+        time.sleep(JANITOR_INTERVAL_SECONDS)
+
+
+def start_janitor():
+    """Index the storage folders and start the background retention thread"""
+    global _checkpoint_folder
+    from book_generator import CHECKPOINT_FOLDER, GENERATED_FOLDER, PDF_FOLDER
+
+    _checkpoint_folder = os.path.abspath(CHECKPOINT_FOLDER)
+    with _lock:
+        for kind, folder, max_bytes, max_age, unit_key, members_of in [
+            ('preview', GENERATED_FOLDER, PREVIEW_MAX_BYTES, PREVIEW_MAX_AGE_SECONDS, _preview_key, _preview_members),
+            ('pdf', PDF_FOLDER, PDF_MAX_BYTES, PDF_MAX_AGE_SECONDS, _book_key, _book_members),
+        ]:
+            index = _FolderIndex(kind, os.path.abspath(folder), max_bytes, max_age, unit_key, members_of)
+            _folders[index.path] = index
+    threading.Thread(target=_janitor_loop, daemon=True, name='storage-janitor').start()
+    print(f"✅ Storage janitor started (every {JANITOR_INTERVAL_SECONDS}s, "
+          f"previews ≤ {PREVIEW_MAX_BYTES // 1024 // 1024} MB, PDFs ≤ {PDF_MAX_BYTES // 1024 // 1024} MB)")
+
+
+def get_janitor_status():
+    """Indexed size per folder and retention counters"""
+    with _lock:
+        folders = {
+            index.kind: {
+                'units': len(index.units),
+                'mb': round(index.bytes / 1024 / 1024, 1),
+                'max_mb': round(index.max_bytes / 1024 / 1024, 1),
+                'max_age_hours': round(index.max_age / 3600, 1),
+            }
+            for index in _folders.values()
+        }
+    return {'folders': folders, **_stats}
@@ -0,0 +1,177 @@
+"""
+Job Store - Durable SQLite record of book generation jobs
+Paid orders survive deploys and crashes: unfinished jobs are re-enqueued on startup,
+and finished pages are checkpointed so a retry only regenerates what is missing
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+JOB_DB_FILE = os.getenv('JOB_DB_PATH', 'generation_jobs.db')
+
+# One shared connection; sqlite3 serializes access, the lock keeps statements atomic
+_conn = None
+_conn_lock = threading.Lock()
+
+UNFINISHED_STATUSES = ('queued', 'running')
+
+
+def _connection():
+    """Open the database once (WAL mode) and create the schema"""
+    global _conn
+    if _conn is None:
+        conn = sqlite3.connect(JOB_DB_FILE, check_same_thread=False, isolation_level=None)
+        # WAL + NORMAL sync: commits are an append to the log, well under a millisecond
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id          TEXT PRIMARY KEY,
+                session     TEXT NOT NULL,
+                status      TEXT NOT NULL,
+                attempts    INTEGER NOT NULL DEFAULT 0,
+                created_at  TEXT NOT NULL,
+                updated_at  TEXT NOT NULL
+            )
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)')
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS page_checkpoints (
+                job_id      TEXT NOT NULL,
+                page_num    INTEGER NOT NULL,
+                kind        TEXT NOT NULL,
+                path        TEXT,
+                attempts    INTEGER NOT NULL DEFAULT 0,
+                updated_at  TEXT NOT NULL,
+                PRIMARY KEY (job_id, page_num, kind)
+            )
+        """)
+        _conn = conn
+    return _conn
+
+
+def compact_session(session_data):
+    """Reduce a Stripe session to the fields generation needs (JSON-serializable)"""
+    metadata = session_data.get('metadata', {}) or {}
+    customer_details = session_data.get('customer_details', {}) or {}
+    return {
+        'id': session_data.get('id'),
+        'metadata': {key: metadata[key] for key in metadata},
+        'customer_details': {'email': customer_details.get('email')},
+    }
+
+
+def insert_job(job_id, session_record):
+    """
+    Persist a new queued job.
+    Returns False if the job already exists (e.g. Stripe re-delivered the webhook).
+    """
+    now = datetime.now().isoformat()
+    with _conn_lock:
+        cursor = _connection().execute(
+            'INSERT OR IGNORE INTO jobs (id, session, status, attempts, created_at, updated_at) '
+            'VALUES (?, ?, ?, 0, ?, ?)',
+            (job_id, json.dumps(session_record), 'queued', now, now)
+        )
+    return cursor.rowcount == 1
+
+
+def update_job(job_id, status=None, add_attempt=False):
+    """Update a job's status and/or count one more generation attempt"""
+    with _conn_lock:
+        _connection().execute(
+            'UPDATE jobs SET status = COALESCE(?, status), attempts = attempts + ?, updated_at = ? '
+            'WHERE id = ?',
+            (status, 1 if add_attempt else 0, datetime.now().isoformat(), job_id)
+        )
+
+
+def get_job(job_id):
+    """Get a job record as a dict, or None"""
+    with _conn_lock:
+        row = _connection().execute(
+            'SELECT id, session, status, attempts, created_at, updated_at FROM jobs WHERE id = ?',
+            (job_id,)
+        ).fetchone()
+    return _row_to_job(row) if row else None
+
+
+def load_unfinished_jobs():
+    """All queued or interrupted jobs, oldest first"""
+    placeholders = ', '.join('?' for _ in UNFINISHED_STATUSES)
+    with _conn_lock:
+        rows = _connection().execute(
+            'SELECT id, session, status, attempts, created_at, updated_at FROM jobs '
+            f'WHERE status IN ({placeholders}) ORDER BY created_at',
+            UNFINISHED_STATUSES
+        ).fetchall()
+    return [_row_to_job(row) for row in rows]
+
+
+def claim_page_attempt(job_id, page_num, kind, retry_budget):
+    """
+    Count one generation attempt for a page.
+
+    A page's first attempt is always allowed. Any later attempt (in this run or
+    after a restart) is a retry and is only allowed while the job's total
+    retries stay under retry_budget. Returns True if the attempt may proceed.
+    """
+    with _conn_lock:
+        conn = _connection()
+        row = conn.execute(
+            'SELECT attempts FROM page_checkpoints WHERE job_id = ? AND page_num = ? AND kind = ?',
+            (job_id, page_num, kind)
+        ).fetchone()
+        if row and row[0] >= 1:
+            retries_used = conn.execute(
+                'SELECT COALESCE(SUM(MAX(attempts - 1, 0)), 0) FROM page_checkpoints WHERE job_id = ?',
+                (job_id,)
+            ).fetchone()[0]
+            if retries_used >= retry_budget:
+                return False
+        conn.execute(
+            'INSERT INTO page_checkpoints (job_id, page_num, kind, attempts, updated_at) VALUES (?, ?, ?, 1, ?) '
+            'ON CONFLICT (job_id, page_num, kind) DO UPDATE SET attempts = attempts + 1, updated_at = excluded.updated_at',
+            (job_id, page_num, kind, datetime.now().isoformat())
+        )
+    return True
+
+
+def save_page_checkpoint(job_id, page_num, kind, path):
+    """Record the stored image of a finished page"""
+    with _conn_lock:
+        _connection().execute(
+            'INSERT INTO page_checkpoints (job_id, page_num, kind, path, attempts, updated_at) VALUES (?, ?, ?, ?, 1, ?) '
+            'ON CONFLICT (job_id, page_num, kind) DO UPDATE SET path = excluded.path, updated_at = excluded.updated_at',
+            (job_id, page_num, kind, path, datetime.now().isoformat())
+        )
+
+
+def get_page_checkpoint(job_id, page_num, kind):
+    """Path of a page's stored image, or None if the page has not finished yet"""
+    with _conn_lock:
+        row = _connection().execute(
+            'SELECT path FROM page_checkpoints WHERE job_id = ? AND page_num = ? AND kind = ?',
+            (job_id, page_num, kind)
+        ).fetchone()
+    return row[0] if row else None
+
+
+def clear_page_checkpoints(job_id):
+    """Forget a job's page checkpoints (their files are removed by the caller)"""
+    with _conn_lock:
+        _connection().execute('DELETE FROM page_checkpoints WHERE job_id = ?', (job_id,))
+
+
+def _row_to_job(row):
+    job_id, session, status, attempts, created_at, updated_at = row
+    return {
+        'id': job_id,
+        'session': json.loads(session),
+        'status': status,
+        'attempts': attempts,
+        'created_at': created_at,
+        'updated_at': updated_at,
+    }
@@ -0,0 +1,134 @@
+"""
+Palette quantization for colored pages
+Colored pages are drawn with the handful of colors the customer picked, so
+they fit an indexed image: an adaptive palette seeded with those colors plus
+black and white, fitted with a weighted k-means over a color histogram.
+"""
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+# Colors are binned at 5 bits per channel for the histogram and the lookup table
+BIN_BITS = 5
+BIN_COUNT = 1 << (3 * BIN_BITS)
+KMEANS_ITERATIONS = 8
+# A histogram bin only becomes an extra initial centroid if it is at least
+# this far (RGB distance) from the centroids chosen so far
+MIN_SEED_DISTANCE = 24.0
+
+BLACK_WHITE = ['#000000', '#FFFFFF']
+
+# An image's pixels binned once for both fit_palette() and apply_palette():
+# the RGB image, its pixels, each pixel's bin, the occupied bins, and the
+# pixel count and mean color of each occupied bin
+ColorHistogram = namedtuple('ColorHistogram', 'rgb pixels bins occupied weights colors')
+
+
+def _hex_to_rgb(color):
+    color = color.lstrip('#')
+    return [int(color[i:i + 2], 16) for i in (0, 2, 4)]
+
+
+def _bin_index(pixels):
+    """5-bit-per-channel bin of each uint8 RGB pixel"""
+    shift = 8 - BIN_BITS
+    r = pixels[:, 0].astype(np.int32) >> shift
+    g = pixels[:, 1].astype(np.int32) >> shift
+    b = pixels[:, 2].astype(np.int32) >> shift
+    return (r << (2 * BIN_BITS)) | (g << BIN_BITS) | b
+
+
+def _nearest(points, centroids):
+    """Index of the nearest centroid for each point (squared RGB distance)"""
+    distances = (
+        (points ** 2).sum(axis=1)[:, None]
+        - 2 * points @ centroids.T
+        + (centroids ** 2).sum(axis=1)[None, :]
+    )
+    return distances.argmin(axis=1)
+
+
+def _initial_centroids(seed_colors, colors, counts, size):
+    """Seed colors first, then the most frequent colors not close to any of them"""
+    centroids = [_hex_to_rgb(c) for c in BLACK_WHITE + list(seed_colors)]
+    centroids = [list(c) for c in dict.fromkeys(tuple(c) for c in centroids)][:size]
+    for i in np.argsort(counts)[::-1]:
+        if len(centroids) >= size:
+            break
+        distance = np.sqrt(((np.array(centroids, dtype=np.float32) - colors[i]) ** 2).sum(axis=1)).min()
+        if distance >= MIN_SEED_DISTANCE:
+            centroids.append(colors[i].tolist())
+    return np.array(centroids, dtype=np.float32)
+
+
+def histogram(pil_img):
+    """ColorHistogram of an image, to share between fit_palette() and apply_palette()"""
+    rgb = pil_img.convert('RGB') if pil_img.mode != 'RGB' else pil_img
+    pixels = np.asarray(rgb, dtype=np.uint8).reshape(-1, 3)
+    bins = _bin_index(pixels)
+    counts = np.bincount(bins, minlength=BIN_COUNT)
+    occupied = np.nonzero(counts)[0]
+    weights = counts[occupied].astype(np.float32)
+    sums = np.stack([np.bincount(bins, weights=pixels[:, ch], minlength=BIN_COUNT)[occupied]
+                     for ch in range(3)], axis=1)
+    colors = (sums / weights[:, None]).astype(np.float32)
+    return ColorHistogram(rgb, pixels, bins, occupied, weights, colors)
+
+
+def fit_palette(pil_img, seed_colors, size=32, hist=None):
+    """
+    Adaptive palette (uint8 array of shape (n, 3), n <= size) for an image.
+
+    seed_colors are '#RRGGBB' strings (the customer's choice); together with
+    black and white they start the palette, the rest adapts to the page.
+    hist is the image's histogram() if the caller already has it.
+    """
+    hist = hist or histogram(pil_img)
+    weights, colors = hist.weights, hist.colors
+
+    # Weighted k-means over the occupied bins
+    centroids = _initial_centroids(seed_colors, colors, weights, size)
+    for _ in range(KMEANS_ITERATIONS):
+        labels = _nearest(colors, centroids)
+        totals = np.bincount(labels, weights=weights, minlength=len(centroids))
+        used = totals > 0
+        for ch in range(3):
+            centroids[used, ch] = (np.bincount(labels, weights=weights * colors[:, ch],
+                                               minlength=len(centroids))[used] / totals[used])
+    return np.clip(np.rint(centroids), 0, 255).astype(np.uint8)
+
+
+def apply_palette(pil_img, palette, hist=None):
+    """
+    Map an image onto a palette from fit_palette().
+    hist is the image's histogram() if the caller already has it.
+
+    Returns (indexed_image, metrics) where metrics has 'colors', 'rmse' and
+    'psnr_db' of the indexed image against the original pixels.
+    """
+    rgb, pixels, bins, occupied, _, colors = hist or histogram(pil_img)
+
+    # Map every pixel through its bin (lookup table built from bin mean colors)
+    lut = np.zeros(BIN_COUNT, dtype=np.uint8)
+    lut[occupied] = _nearest(colors, palette.astype(np.float32))
+    indices = lut[bins]
+
+    indexed = Image.frombytes('P', rgb.size, indices.tobytes())
+    indexed.putpalette(palette.tobytes())
+
+    error = pixels.astype(np.int16) - palette[indices].astype(np.int16)
+    rmse = float(np.sqrt((error.astype(np.float32) ** 2).mean()))
+    # Floor the error so an exact match stays a finite (JSON-safe) number
+    psnr = float(20 * np.log10(255.0 / max(rmse, 0.01)))
+    return indexed, {'colors': len(palette), 'rmse': round(rmse, 2), 'psnr_db': round(psnr, 2)}
+
+
+def quantize(pil_img, seed_colors, size=32):
+    """
+    Reduce an RGB image to an indexed (mode 'P') image of at most `size`
+    colors seeded with seed_colors. Returns (indexed_image, metrics) as
+    apply_palette() does.
+    """
+    hist = histogram(pil_img)
+    return apply_palette(pil_img, fit_palette(pil_img, seed_colors, size, hist), hist)
@@ -1,8 +1,10 @@
 import os
 import json
+import hashlib
 import threading
 import tempfile
 import stripe
+import janitor
 from flask import Blueprint, request, jsonify
 from dotenv import load_dotenv
 from datetime import datetime
@@ -24,6 +26,29 @@ COUNTER_FILE = 'order_counter.json'
 # Get initial counter from environment variable (persists across deployments on Render)
 INITIAL_ORDER_COUNT = int(os.getenv('INITIAL_ORDER_COUNT', '0'))
 
+# Strong ETags of served PDFs: path -> (mtime_ns, size, sha256), so range
+# requests for the same book do not re-hash the file every time
+_etag_cache = {}
+_etag_lock = threading.Lock()
+
+def _pdf_etag(path):
+    """SHA-256 of a file's content, recomputed only when its mtime or size changes"""
+    st = os.stat(path)
+    with _etag_lock:
+        cached = _etag_cache.get(path)
+        if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+            return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    etag = digest.hexdigest()
+
+    with _etag_lock:
+        _etag_cache[path] = (st.st_mtime_ns, st.st_size, etag)
+    return etag
+
 def _write_counter_atomically(data):
     """Write counter file atomically to prevent corruption on concurrent writes."""
     dir_name = os.path.dirname(os.path.abspath(COUNTER_FILE)) or '.'
@@ -112,7 +137,11 @@ def create_checkout():
         format_type = data.get('format', 'pdf')  # 'pdf' or 'physical'
         book_type = data.get('bookType', 'blackwhite')  # 'blackwhite' or 'colored'
         selections = data.get('selections', {})
-        # No preview image - we'll regenerate all pages fresh
+        # The approved preview (file in generated_images/) becomes page 1 of the book
+        preview_file = data.get('previewFile')
+        from book_generator import is_valid_preview_filename
+        if not is_valid_preview_filename(preview_file):
+            preview_file = None
         
         # Get current price (promotional or regular)
         base_price, is_promo, remaining = get_current_price()
@@ -171,7 +200,7 @@ def create_checkout():
                 'topic': selections.get('topic', ''),
                 'difficulty': selections.get('difficulty', 'Easy'),
                 'colors': json.dumps(selections.get('colors', [])),
-                # No preview image - we'll regenerate all pages fresh
+                'preview': preview_file or '',
             }
         }
         
@@ -272,14 +301,15 @@ def stripe_webhook():
             # STEP 2: Add to generation queue (prevents memory overload)
             print("📚 Step 2: Adding to generation queue...")
             
-            from generation_queue import add_to_queue, get_queue_status
+            from generation_queue import add_to_queue, get_queue_status, get_session_state
             
             # Add job to queue
             job_id = add_to_queue(session)
             queue_status = get_queue_status()
+            job_state = get_session_state(job_id) or {}
             
             print(f"✅ Job {job_id} added to queue!")
-            print(f"   Queue position: {queue_status['queue_size']}")
+            print(f"   Queue position: {job_state.get('queue_position', job_state.get('state'))}")
             print(f"   Currently processing: {queue_status['current_job'] or 'None'}\n")
             print(f"{'='*60}\n")
             
@@ -313,40 +343,84 @@ def get_session_status(session_id):
         }), 400
 
 
+def _session_state(session_id):
+    """Queue state of a session's job, falling back to the session mapping after a restart"""
+    from generation_queue import get_session_state
+
+    # O(1) lookup in the queue's per-session index (no file load, no scan)
+    state = get_session_state(session_id)
+
+    if state is None:
+        # Not seen by this process (e.g. completed before a restart)
+        from session_manager import get_session_pdf
+        session_data = get_session_pdf(session_id)
+        if session_data and session_data.get('status') == 'completed':
+            state = {'state': 'completed', 'pdf_filename': session_data['pdf_filename']}
+    return state
+
+
+def _pdf_variants(filename):
+    """Builds of a book that exist on disk (see PDF_VARIANTS), for ?variant= links"""
+    from werkzeug.security import safe_join
+    from pdf_generator import OUTPUT_PROFILES, variant_path
+
+    pdf_path = safe_join(os.path.join(os.path.dirname(__file__), 'generated_pdfs'), filename)
+    if not pdf_path:
+        return []
+    return [variant for variant in OUTPUT_PROFILES if os.path.isfile(variant_path(pdf_path, variant))]
+
+
+def _status_payload(state):
+    """Client-facing status of a session from its queue state (None = webhook not received yet)"""
+    if state and state['state'] == 'completed':
+        return {
+            'success': True,
+            'status': 'completed',
+            'pdf_filename': state['pdf_filename'],
+            'variants': _pdf_variants(state['pdf_filename']),
+            'message': 'Your book is ready! 🎉'
+        }
+
+    if state and state['state'] == 'failed':
+        return {
+            'success': True,
+            'status': 'failed',
+            'message': 'We could not generate your book. Our team will contact you by email.'
+        }
+
+    if state and state['state'] == 'generating':
+        payload = {
+            'success': True,
+            'status': 'generating',
+            'message': 'Your book is being generated... 🎨'
+        }
+        if state.get('pages_total'):
+            payload.update(pages_done=state['pages_done'], pages_total=state['pages_total'])
+            payload['message'] = f"Your book is being generated... 🎨 ({state['pages_done']}/{state['pages_total']} pages)"
+        return payload
+
+    if state and state['state'] == 'queued':
+        position = state['queue_position']
+        return {
+            'success': True,
+            'status': 'queued',
+            'queue_position': position,
+            'message': f"Your book is in the queue (position: {position})... 📚"
+        }
+
+    # Webhook not received yet
+    return {
+        'success': True,
+        'status': 'queued',
+        'message': 'Your order is being confirmed... 📚'
+    }
+
+
 @payment_bp.route('/api/generation-status/<session_id>', methods=['GET'])
 def get_generation_status(session_id):
     """Get the generation status and PDF path for a session"""
     try:
-        from session_manager import get_session_pdf
-        from generation_queue import get_queue_status
-        
-        # Check if session has a completed PDF
-        session_data = get_session_pdf(session_id)
-        
-        if session_data and session_data.get('status') == 'completed':
-            return jsonify({
-                'success': True,
-                'status': 'completed',
-                'pdf_filename': session_data['pdf_filename'],
-                'message': 'Your book is ready! 🎉'
-            })
-        
-        # Otherwise check queue status
-        queue_status = get_queue_status()
-        
-        if queue_status['is_processing']:
-            return jsonify({
-                'success': True,
-                'status': 'generating',
-                'message': 'Your book is being generated... 🎨'
-            })
-        else:
-            return jsonify({
-                'success': True,
-                'status': 'queued',
-                'queue_position': queue_status['queue_size'],
-                'message': f"Your book is in the queue (position: {queue_status['queue_size']})... 📚"
-            })
+        return jsonify(_status_payload(_session_state(session_id)))
         
     except Exception as e:
         return jsonify({
@@ -355,22 +429,102 @@ def get_generation_status(session_id):
         }), 400
 
 
+# Each open event stream holds a server thread, so only a few may be open at
+# once; beyond that clients are told to fall back to polling (503)
+SSE_MAX_STREAMS = int(os.getenv('SSE_MAX_STREAMS', 4))
+SSE_KEEPALIVE_SECONDS = 15
+SSE_MAX_SECONDS = 600  # clients reconnect after this (EventSource does so automatically)
+_sse_streams = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+
+@payment_bp.route('/api/generation-events/<session_id>', methods=['GET'])
+def generation_events(session_id):
+    """
+    Server-Sent Events stream of a session's generation progress.
+    Every event carries the same JSON as /api/generation-status; the event
+    name is its status, or 'page' after each finished page (pages_done /
+    pages_total). The stream ends after 'completed' or 'failed'.
+    """
+    from flask import Response, stream_with_context
+    from generation_queue import subscribe, unsubscribe
+
+    if not _sse_streams.acquire(blocking=False):
+        return jsonify({'success': False, 'error': 'Too many open streams, poll /api/generation-status'}), 503
+
+    # Subscribe before the snapshot so no transition falls in between
+    listener = subscribe(session_id)
+
+    def format_event(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    def events():
+        import queue
+        import time
+        yield f"retry: {SSE_KEEPALIVE_SECONDS * 1000}\n\n"
+        payload = _status_payload(_session_state(session_id))
+        yield format_event(payload['status'], payload)
+        deadline = time.monotonic() + SSE_MAX_SECONDS
+        while payload['status'] not in ('completed', 'failed') and time.monotonic() < deadline:
+            try:
+                event, state = listener.get(timeout=SSE_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                # Queue positions move without an event of this session
+                current = _status_payload(_session_state(session_id))
+                if current != payload:
+                    payload = current
+                    yield format_event(payload['status'], payload)
+                else:
+                    yield ": keepalive\n\n"
+                continue
+            payload = _status_payload(state)
+            yield format_event('page' if event == 'page' else payload['status'], payload)
+
+    def close():
+        unsubscribe(session_id, listener)
+        _sse_streams.release()
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # no proxy buffering of the stream
+    })
+    # Runs when the server closes the response, even if the stream never started
+    response.call_on_close(close)
+    return response
+
+
 @payment_bp.route('/api/download-pdf/<filename>', methods=['GET'])
 def download_pdf(filename):
-    """Download a generated PDF"""
+    """
+    Download a generated PDF.
+    Conditional and partial requests are honored (Range / If-Range,
+    If-None-Match against a strong SHA-256 ETag, If-Modified-Since), so
+    viewers can fetch a linearized book's first pages before the rest.
+    ?variant=print|screen|email picks that build of the book; the screen
+    build (the plain file name) is served when the variant does not exist.
+    """
     try:
-        import os
         from flask import send_file
+        from werkzeug.security import safe_join
+        from pdf_generator import OUTPUT_PROFILES, variant_path
         
         pdf_folder = os.path.join(os.path.dirname(__file__), 'generated_pdfs')
-        pdf_path = os.path.join(pdf_folder, filename)
+        pdf_path = safe_join(pdf_folder, filename)
+        
+        variant = request.args.get('variant')
+        if pdf_path and variant in OUTPUT_PROFILES:
+            variant_file = variant_path(pdf_path, variant)
+            if os.path.isfile(variant_file):
+                pdf_path = variant_file
         
-        if os.path.exists(pdf_path):
+        if pdf_path and os.path.isfile(pdf_path):
+            janitor.touch(pdf_path)
             return send_file(
                 pdf_path,
                 mimetype='application/pdf',
                 as_attachment=False,  # Display in browser
-                download_name=filename
+                download_name=os.path.basename(pdf_path),
+                conditional=True,
+                etag=_pdf_etag(pdf_path),  # revalidated per request (no-cache) → cheap 304s
             )
         else:
             return jsonify({
@@ -385,6 +539,66 @@ def download_pdf(filename):
         }), 400
 
 
+def _thumbnail_folder(filename):
+    """Thumbnail folder of a generated PDF (None for a bad name)"""
+    from werkzeug.security import safe_join
+    from pdf_generator import thumbnail_dir
+
+    if not filename.endswith('.pdf'):
+        return None
+    pdf_path = safe_join(os.path.join(os.path.dirname(__file__), 'generated_pdfs'), filename)
+    return thumbnail_dir(pdf_path) if pdf_path else None
+
+
+@payment_bp.route('/api/pdf-thumbnails/<filename>', methods=['GET'])
+def list_pdf_thumbnails(filename):
+    """List the page thumbnails of a generated PDF, in page order"""
+    folder = _thumbnail_folder(filename)
+    if not folder or not os.path.isdir(folder):
+        return jsonify({
+            'success': False,
+            'error': 'Thumbnails not found'
+        }), 404
+
+    names = sorted(name for name in os.listdir(folder) if name.startswith('page_') and not name.endswith('.tmp'))
+    return jsonify({
+        'success': True,
+        'thumbnails': [
+            {
+                'page': int(name[5:8]),
+                'url': f"/api/pdf-thumbnail/{filename}/{name}",
+            }
+            for name in names
+        ]
+    })
+
+
+@payment_bp.route('/api/pdf-thumbnail/<filename>/<thumb>', methods=['GET'])
+def pdf_thumbnail(filename, thumb):
+    """
+    Serve one page thumbnail.
+    The URL names a unique book and page and its content never changes, so
+    browsers may cache it for a year without revalidating.
+    """
+    from flask import send_file
+    from werkzeug.security import safe_join
+
+    folder = _thumbnail_folder(filename)
+    thumb_path = safe_join(folder, thumb) if folder else None
+    if not thumb_path or not os.path.isfile(thumb_path):
+        return jsonify({
+            'success': False,
+            'error': 'Thumbnail not found'
+        }), 404
+
+    janitor.touch(folder)
+    response = send_file(thumb_path, conditional=True, etag=True, max_age=365 * 24 * 3600)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+
 @payment_bp.route('/api/contact-feedback', methods=['POST'])
 def contact_feedback():
     """Handle contact form feedback submissions"""
@@ -1,44 +1,316 @@
 import os
+import shutil
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
-from PIL import Image
+from PIL import Image, features
 import io
+import threading
+import palette as palette_quantizer
+from pdf_stream_writer import StreamingCanvas, EncodedImage, encode_image
+
+try:
+    import pikepdf  # optional: linearized ("fast web view") output
+except ImportError:
+    pikepdf = None
+
+# 'stream': write each page to disk as it is appended (memory independent of page count)
+# 'reportlab': classic ReportLab Canvas, keeps the whole document in memory until save
+PDF_WRITER = os.getenv('PDF_WRITER', 'stream')
+
+# Black-and-white line-art pages are thresholded to 1 bit per pixel:
+# pixels at or above PDF_BW_THRESHOLD (0-255 gray) become white.
+# PDF_BILEVEL_CODEC 'g4' = CCITT Group 4, 'flate' = 1-bit Flate (stream writer only)
+BW_THRESHOLD = int(os.getenv('PDF_BW_THRESHOLD', 160))
+BILEVEL_CODEC = os.getenv('PDF_BILEVEL_CODEC', 'g4')
+
+# Colored pages are quantized to an indexed palette of PDF_PALETTE_SIZE colors
+# seeded with the customer's colors (streaming writer only). A page whose
+# PSNR against the original falls below the profile's palette_min_psnr
+# (PDF_PALETTE_MIN_PSNR by default) keeps full RGB, or JPEG for profiles with
+# a jpeg_quality.
+PALETTE_SIZE = int(os.getenv('PDF_PALETTE_SIZE', 32))
+PALETTE_MIN_PSNR = float(os.getenv('PDF_PALETTE_MIN_PSNR', 30))
+
+# Rewrite finished PDFs linearized so viewers can show page 1 before the rest
+# has downloaded (needs pikepdf; silently skipped without it)
+LINEARIZE = os.getenv('PDF_LINEARIZE', 'true').lower() in ('1', 'true', 'yes')
+
+# Small per-page previews written next to the PDF while its pages are appended
+THUMBNAIL_SIZE = int(os.getenv('PDF_THUMBNAIL_SIZE', 256))  # longest side in px
+THUMBNAIL_QUALITY = 70
+THUMBNAIL_FORMAT, THUMBNAIL_EXT = ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+# Output profiles. dpi: pixels per inch a placed image needs – larger images
+# are resampled down to exactly that, smaller ones are never upscaled, only
+# flagged. palette_size: colors of quantized colored pages. palette_min_psnr:
+# PSNR (dB) a quantized page needs to be kept indexed. jpeg_quality: store the
+# cover, and colored pages whose palette is rejected, as JPEG instead of
+# lossless. linearize: fast web view.
+OUTPUT_PROFILES = {
+    'print': {
+        'dpi': int(os.getenv('PDF_PRINT_DPI', 300)),
+        'palette_size': PALETTE_SIZE,
+        'palette_min_psnr': PALETTE_MIN_PSNR,
+        'jpeg_quality': None,
+        'linearize': False,
+    },
+    'screen': {
+        'dpi': int(os.getenv('PDF_SCREEN_DPI', 150)),
+        'palette_size': PALETTE_SIZE,
+        'palette_min_psnr': PALETTE_MIN_PSNR,
+        'jpeg_quality': None,
+        'linearize': LINEARIZE,
+    },
+    'email': {
+        'dpi': int(os.getenv('PDF_EMAIL_DPI', 96)),
+        'palette_size': int(os.getenv('PDF_EMAIL_PALETTE_SIZE', 16)),
+        'palette_min_psnr': float(os.getenv('PDF_EMAIL_PALETTE_MIN_PSNR', 26)),
+        'jpeg_quality': 75,
+        'linearize': False,
+    },
+}
+# Gemini returns 1024 px pages, about 141 DPI on the A4 image area, so screen
+# is the profile the pipeline actually fills
+PDF_PROFILE = os.getenv('PDF_PROFILE', 'screen')
+
+# Variants generate_complete_book writes in one pass. The primary variant keeps
+# the plain book file name (browser view, download); the others get a suffix.
+# print only differs from screen for sources above ~150 DPI, so it is opt-in
+# (PDF_VARIANTS=screen,print,email); downloads fall back to screen without it.
+PDF_VARIANTS = [v.strip() for v in os.getenv('PDF_VARIANTS', 'screen,email').split(',') if v.strip()]
+PRIMARY_VARIANT = 'screen'
+# Resample only when the image is this much larger than needed,
+# flag it when its effective resolution is below this share of the target
+OVERSIZE_TOLERANCE = 1.05
+UNDERSIZE_TOLERANCE = 0.9
+
+
+# ---------------------------------------------------------------------------
+# Codec accounting – image decodes/encodes done while writing book pages
+# ---------------------------------------------------------------------------
+
+_codec_lock = threading.Lock()
+_codec_stats = {'pages': 0, 'decodes': 0, 'encodes': 0, 'resampled': 0, 'undersized': 0,
+                'palette_pages': 0, 'palette_fallbacks': 0}
+_palette_psnr = {'sum': 0.0, 'min': None}
+
+
+def _count_codec(key):
+    with _codec_lock:
+        _codec_stats[key] += 1
+
+
+def _record_palette(psnr, used):
+    """Account one quantized page: its PSNR and whether the indexed image was kept"""
+    with _codec_lock:
+        _codec_stats['palette_pages' if used else 'palette_fallbacks'] += 1
+        _palette_psnr['sum'] += psnr
+        _palette_psnr['min'] = psnr if _palette_psnr['min'] is None else min(_palette_psnr['min'], psnr)
+
+
+def get_codec_stats():
+    """Image decode/encode/resample counts for book pages since startup, with per-page averages"""
+    with _codec_lock:
+        stats = dict(_codec_stats)
+        psnr = dict(_palette_psnr)
+    pages = stats['pages'] or 1
+    stats['decodes_per_page'] = round(stats['decodes'] / pages, 2)
+    stats['encodes_per_page'] = round(stats['encodes'] / pages, 2)
+    quantized = stats['palette_pages'] + stats['palette_fallbacks']
+    stats['palette_psnr_avg'] = round(psnr['sum'] / quantized, 2) if quantized else None
+    stats['palette_psnr_min'] = psnr['min']
+    return stats
 
 
 # ---------------------------------------------------------------------------
 # Low-level streaming helpers
 # ---------------------------------------------------------------------------
 
-def open_pdf_canvas(output_path, book_details):
+def _profile_dpi(profile):
+    """Target DPI of an output profile name (None = PDF_PROFILE)"""
+    return OUTPUT_PROFILES[profile or PDF_PROFILE]['dpi']
+
+
+class VariantSet:
+    """
+    Several canvases of the same book, one per output variant. Pass it
+    wherever a canvas is expected: append_image_to_canvas() decodes each page
+    once and draws it into every variant with that variant's profile.
+    """
+
+    def __init__(self, pdf_path, canvases):
+        self.pdf_path = pdf_path
+        # [(variant, canvas, path)], highest DPI first so resampling cascades down
+        self.canvases = sorted(canvases, key=lambda item: -_profile_dpi(item[0]))
+        # Pages below a variant's target DPI: count, lowest source DPI, variants
+        self.undersized = {'pages': 0, 'min_dpi': None, 'variants': set()}
+
+    def _note_undersized(self, source_dpi, variants):
+        self.undersized['pages'] += 1
+        low = self.undersized['min_dpi']
+        self.undersized['min_dpi'] = source_dpi if low is None else min(low, source_dpi)
+        self.undersized['variants'].update(variants)
+
+    def paths(self):
+        return {variant: path for variant, _, path in self.canvases}
+
+
+def variant_path(pdf_path, variant):
+    """File of a book variant: the primary keeps pdf_path, others get _<variant>.pdf"""
+    if variant == PRIMARY_VARIANT:
+        return pdf_path
+    return f"{os.path.splitext(pdf_path)[0]}_{variant}.pdf"
+
+
+def open_pdf_canvas(output_path, book_details, profile=None):
     """
     Open a new PDF canvas and add the title page.
-    Returns the canvas object; caller must call finalize_pdf() when done.
+    Returns the canvas object; caller must call finalize_pdf() when done
+    (or discard_pdf() to abandon it).
+
+    With PDF_WRITER='stream' (default) this is a StreamingCanvas that flushes
+    every page to output_path as soon as it is finished. profile selects the
+    cover resolution and codecs from OUTPUT_PROFILES (default PDF_PROFILE).
     """
     page_width, page_height = A4
-    c = canvas.Canvas(output_path, pagesize=A4)
-    add_title_page(c, book_details, page_width, page_height)
+    if PDF_WRITER == 'reportlab':
+        c = canvas.Canvas(output_path, pagesize=A4)
+    else:
+        c = StreamingCanvas(output_path, pagesize=A4, bilevel_codec=BILEVEL_CODEC)
+    add_title_page(c, book_details, page_width, page_height, profile=profile)
     return c
 
 
-def append_image_to_canvas(c, img_path, page_number, delete_after=True):
+def open_pdf_variants(pdf_path, book_details, variants=None):
+    """
+    Open one canvas per output variant (default PDF_VARIANTS) for a single
+    pass over the pages. The primary variant is always included, so pdf_path
+    itself is written. Returns a VariantSet; finalize_pdf() / discard_pdf()
+    accept it like a canvas.
+    """
+    canvases = []
+    try:
+        for variant in dict.fromkeys([PRIMARY_VARIANT] + list(variants or PDF_VARIANTS)):
+            path = variant_path(pdf_path, variant)
+            canvases.append((variant, open_pdf_canvas(path, book_details, profile=variant), path))
+    except Exception:
+        for _, c, path in canvases:
+            discard_pdf(c, path)
+        raise
+    return VariantSet(pdf_path, canvases)
+
+
+def _draw_image(c, pil_img, x, y, width, height):
+    """Draw a decoded PIL image (or, on the streaming writer, an EncodedImage) on either canvas type"""
+    if isinstance(c, StreamingCanvas):
+        c.drawImage(pil_img, x, y, width=width, height=height)
+    else:
+        # ReportLab has no 1-bit path (it would expand to RGB); gray is the closest
+        if pil_img.mode == '1':
+            pil_img = pil_img.convert('L')
+        c.drawImage(ImageReader(pil_img), x, y, width=width, height=height)
+
+
+def fit_to_dpi(pil_img, width_pt, height_pt, dpi):
+    """
+    Resample an image to exactly the pixels a width_pt x height_pt rectangle
+    needs at dpi (one LANCZOS pass, box-reduced first for large factors).
+    Never upscales. Returns (image, effective_dpi).
+    """
+    target = (max(1, round(width_pt / 72 * dpi)), max(1, round(height_pt / 72 * dpi)))
+    if pil_img.width > target[0] * OVERSIZE_TOLERANCE:
+        pil_img = pil_img.resize(target, Image.LANCZOS, reducing_gap=2.0)
+        _count_codec('resampled')
+    return pil_img, pil_img.width * 72 / width_pt
+
+
+def draw_shared(c, name, draw, x=0, y=0, bbox=None):
+    """
+    Draw a repeated element (header, footer, decoration) as a form XObject.
+
+    The first call in a document records draw(c) as form `name`; every call
+    then places it with a single reference, offset by (x, y). bbox is the
+    form's (x0, y0, x1, y1) in its own coordinates (default: the page).
+    Works with ReportLab's Canvas and StreamingCanvas alike.
+    """
+    if not c.hasForm(name):
+        c.beginForm(name, *(bbox or ()))
+        draw(c)
+        c.endForm()
+    c.saveState()
+    c.translate(x, y)
+    c.doForm(name)
+    c.restoreState()
+
+
+def thumbnail_dir(pdf_path):
+    """Folder holding a book's page thumbnails: <pdf name>_thumbs next to the PDF"""
+    return os.path.splitext(pdf_path)[0] + '_thumbs'
+
+
+def _write_thumbnail(pil_img, folder, page_number):
+    """Save a small WebP (or JPEG) of an already decoded page as page_NNN.<ext>"""
+    scale = THUMBNAIL_SIZE / max(pil_img.size)
+    size = (max(1, round(pil_img.width * scale)), max(1, round(pil_img.height * scale)))
+    thumb = pil_img.resize(size, Image.LANCZOS, reducing_gap=2.0) if scale < 1 else pil_img
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"page_{page_number:03d}.{THUMBNAIL_EXT}")
+    tmp_path = f"{path}.tmp"
+    thumb.save(tmp_path, format=THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+    os.replace(tmp_path, path)
+
+
+def to_bilevel(pil_img, threshold=None):
+    """Threshold an image to 1 bit per pixel (mode '1') for line-art pages"""
+    threshold = BW_THRESHOLD if threshold is None else threshold
+    lut = [255 if value >= threshold else 0 for value in range(256)]
+    return pil_img.convert('L').point(lut, mode='1')
+
+
+def append_image_to_canvas(c, image, page_number, delete_after=True, bilevel=False, profile=None,
+                           palette=None, thumbnail_folder=None):
     """
     Draw one image onto the next PDF page, then optionally delete the source file.
     Call c.showPage() internally so the canvas is ready for the next image.
 
+    The image is decoded once and its pixels are handed straight to the
+    canvas, which compresses them into the PDF – no intermediate PNG re-encode.
+    Line-art pages (bilevel=True) are thresholded to 1 bit per pixel and
+    embedded with a bilevel codec instead of as 24-bit RGB. Colored pages
+    (palette=[...]) are quantized to an indexed image seeded with those colors.
+    Images larger than the profile's DPI needs for the placed rectangle are
+    resampled once (JPEGs are draft-decoded at reduced scale first); smaller
+    ones are embedded as they are and counted as undersized. With
+    thumbnail_folder, a small preview of the page is saved from the same
+    decoded pixels. Given a VariantSet, the page is decoded once and drawn
+    into every variant, each resampled and encoded with its own profile.
+
     Args:
-        c: ReportLab Canvas opened by open_pdf_canvas()
-        img_path (str): Path to the image file
+        c: Canvas opened by open_pdf_canvas(), or a VariantSet from open_pdf_variants()
+        image (str | bytes): Path to the image file, or encoded image bytes
+            kept in memory (e.g. straight from the Gemini response)
         page_number (int): 1-based page number shown at the bottom
         delete_after (bool): Delete the image file after writing to PDF
+            (ignored for in-memory bytes)
+        bilevel (bool): Black-and-white line art – embed as a 1-bit image
+        profile (str): Output profile from OUTPUT_PROFILES (default PDF_PROFILE;
+            ignored for a VariantSet)
+        palette (list): Customer's '#RRGGBB' colors – quantize this colored
+            page to an indexed palette seeded with them (may be empty)
+        thumbnail_folder (str): Write page_NNN.webp here (see thumbnail_dir())
     """
     page_width, page_height = A4
     padding = 36  # 0.5 inch
 
-    pil_img = Image.open(img_path)
-    if pil_img.mode != 'RGB':
-        pil_img = pil_img.convert('RGB')
+    if isinstance(image, (bytes, bytearray)):
+        pil_img = Image.open(io.BytesIO(image))
+        img_path = None
+    else:
+        pil_img = Image.open(image)
+        img_path = image
 
+    # Layout only needs the header size, so it is known before decoding
     img_w, img_h = pil_img.size
     aspect = img_w / img_h
     max_w = page_width - 2 * padding
@@ -60,32 +332,144 @@ def append_image_to_canvas(c, img_path, page_number, delete_after=True):
     x = (page_width - new_w) / 2
     y = (page_height - new_h) / 2
 
-    buf = io.BytesIO()
-    pil_img.save(buf, format='PNG')
-    buf.seek(0)
-    pil_img.close()
-    del pil_img
+    if isinstance(c, VariantSet):
+        targets = [(canvas_obj, variant) for variant, canvas_obj, _ in c.canvases]
+    else:
+        targets = [(c, profile or PDF_PROFILE)]
+
+    dpi = _profile_dpi(targets[0][1])
+    target = (round(new_w / 72 * dpi), round(new_h / 72 * dpi))
+    pil_img.draft('L' if bilevel else 'RGB', target)  # JPEG: decode at reduced scale
+    pil_img.load()
+    _count_codec('decodes')
+    if bilevel:
+        pil_img = pil_img.convert('L')
+    elif pil_img.mode not in ('RGB', 'L'):
+        pil_img = pil_img.convert('RGB')
+
+    undersized = []
+    palettes = {}  # palette_size -> palette fitted on the sharpest variant
+    for index, (canvas_obj, variant) in enumerate(targets):
+        settings = OUTPUT_PROFILES[variant]
+        dpi = settings['dpi']
+        # Variants are ordered by DPI, so each one resamples the previous result
+        resampled, effective_dpi = fit_to_dpi(pil_img, new_w, new_h, dpi)
+        if resampled is not pil_img:
+            pil_img.close()
+            pil_img = resampled
+        if index == 0:
+            source_dpi = effective_dpi
+        if effective_dpi < dpi * UNDERSIZE_TOLERANCE:
+            undersized.append(variant)
+        if index == 0 and thumbnail_folder:
+            try:
+                _write_thumbnail(pil_img, thumbnail_folder, page_number)
+            except OSError as e:
+                print(f"⚠️ Could not write thumbnail for page {page_number}: {e}")
 
-    c.drawImage(ImageReader(buf), x, y, width=new_w, height=new_h)
-    c.setFont("Helvetica", 10)
-    c.drawCentredString(page_width / 2, 20, f"Page {page_number}")
-    c.showPage()
+        page_img = pil_img
+        if bilevel:
+            # Threshold after resampling so line edges are averaged first
+            page_img = to_bilevel(pil_img)
+        elif palette is not None and isinstance(canvas_obj, StreamingCanvas):
+            # ReportLab would expand an indexed image back to RGB, so only the
+            # streaming writer benefits from quantizing
+            size = settings['palette_size']
+            hist = palette_quantizer.histogram(pil_img)
+            if size not in palettes:
+                palettes[size] = palette_quantizer.fit_palette(pil_img, palette, size, hist)
+            indexed, metrics = palette_quantizer.apply_palette(pil_img, palettes[size], hist)
+            min_psnr = settings['palette_min_psnr']
+            used = metrics['psnr_db'] >= min_psnr
+            _record_palette(metrics['psnr_db'], used)
+            if used:
+                page_img = indexed
+            else:
+                indexed.close()
+                fallback = 'RGB'
+                if settings['jpeg_quality']:
+                    # Lossless RGB would make a size-capped variant the largest one
+                    page_img = encode_image(pil_img, BILEVEL_CODEC, jpeg_quality=settings['jpeg_quality'])
+                    fallback = f"JPEG q{settings['jpeg_quality']}"
+                print(f"   ⚠️  Page {page_number} ({variant}) palette PSNR {metrics['psnr_db']} dB "
+                      f"< {min_psnr} – keeping {fallback}")
+
+        _draw_image(canvas_obj, page_img, x, y, new_w, new_h)
+        _count_codec('encodes')  # the canvas' compression of the pixels
+        canvas_obj.setFont("Helvetica", 10)
+        canvas_obj.drawCentredString(page_width / 2, 20, f"Page {page_number}")
+        canvas_obj.showPage()
+        if page_img is not pil_img and not isinstance(page_img, EncodedImage):
+            page_img.close()
 
-    buf.close()
+    if undersized:
+        # Counted here, reported once per book by finalize_pdf()
+        _count_codec('undersized')
+        if isinstance(c, VariantSet):
+            c._note_undersized(source_dpi, undersized)
+    _count_codec('pages')
 
-    if delete_after:
+    pil_img.close()
+    del pil_img
+
+    if delete_after and img_path:
         try:
             os.remove(img_path)
         except OSError as e:
             print(f"⚠️ Could not delete temp image {img_path}: {e}")
 
 
-def finalize_pdf(c, output_path):
-    """Save and close the canvas."""
+def finalize_pdf(c, output_path, linearize=None):
+    """
+    Save and close the canvas (or every canvas of a VariantSet).
+    With linearize (default LINEARIZE; per profile for variants) and pikepdf
+    installed, the file is then rewritten as a linearized PDF; if that fails
+    the plain PDF is kept.
+    """
+    if isinstance(c, VariantSet):
+        for variant, canvas_obj, path in c.canvases:
+            finalize_pdf(canvas_obj, path, linearize=OUTPUT_PROFILES[variant]['linearize'])
+        if c.undersized['pages']:
+            wants = ', '.join(f"{v} wants {OUTPUT_PROFILES[v]['dpi']}" for v in sorted(c.undersized['variants']))
+            print(f"   ⚠️  {c.undersized['pages']} page(s) below target resolution, "
+                  f"down to {c.undersized['min_dpi']:.0f} DPI ({wants})")
+        return
     c.save()
+    if LINEARIZE if linearize is None else linearize:
+        linearize_pdf(output_path)
     print(f"✅ PDF saved: {output_path}")
 
 
+def linearize_pdf(path):
+    """Rewrite a PDF in place as linearized ("fast web view"). Returns True on success."""
+    if pikepdf is None:
+        return False
+    tmp_path = f"{path}.linearized"
+    try:
+        with pikepdf.open(path) as pdf:
+            pdf.save(tmp_path, linearize=True)
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        print(f"⚠️ Could not linearize {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+
+def discard_pdf(c, output_path):
+    """Abandon an unfinished canvas, removing anything already flushed to disk (and its thumbnails)."""
+    if isinstance(c, VariantSet):
+        for _, canvas_obj, path in c.canvases:
+            discard_pdf(canvas_obj, path)
+        return
+    if isinstance(c, StreamingCanvas):
+        c.abort()
+    elif os.path.exists(output_path):
+        os.remove(output_path)
+    shutil.rmtree(thumbnail_dir(output_path), ignore_errors=True)
+
+
 # ---------------------------------------------------------------------------
 # Legacy batch helper (kept for backward-compatibility)
 # ---------------------------------------------------------------------------
@@ -108,17 +492,91 @@ def create_coloring_book_pdf(images, output_path, book_details):
         return False
 
 
-def add_title_page(canvas_obj, book_details, width, height):
+# ---------------------------------------------------------------------------
+# Title page – frontpage.png is prepared once per process (and again only
+# when the file changes), then stamped into every book without codec work
+# ---------------------------------------------------------------------------
+
+FRONTPAGE_CANDIDATES = [
+    os.path.join(os.path.dirname(__file__), '..', 'images', 'frontpage.png'),
+    os.path.join(os.path.dirname(__file__), '..', 'public', 'images', 'frontpage.png'),
+]
+
+_cover_lock = threading.Lock()
+_cover = {'path': None, 'key': None, 'layout': None, 'images': {}}  # images: (streaming, profile) -> image
+
+
+def _frontpage_key():
+    """(path, mtime, size) of frontpage.png, or None if it does not exist"""
+    path = _cover['path']
+    if path:
+        try:
+            st = os.stat(path)
+            return path, st.st_mtime_ns, st.st_size
+        except OSError:
+            pass  # moved or deleted: probe the candidates again
+    for path in FRONTPAGE_CANDIDATES:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        _cover['path'] = path
+        return path, st.st_mtime_ns, st.st_size
+    return None
+
+
+def _cover_layout(img_width, img_height, width, height):
+    """Position and size that fill the whole page, keeping the aspect ratio"""
+    aspect_ratio = img_width / img_height
+    if aspect_ratio > width / height:
+        # Image is wider - fit to height
+        new_height = height
+        new_width = height * aspect_ratio
+        return (width - new_width) / 2, 0, new_width, new_height
+    # Image is taller - fit to width
+    new_width = width
+    new_height = width / aspect_ratio
+    return 0, (height - new_height) / 2, new_width, new_height
+
+
+def _prepared_cover(canvas_obj, width, height, profile):
+    """
+    Cover image ready to draw and its (x, y, w, h), or None without frontpage.png.
+
+    For the streaming writer the cached image is an EncodedImage (resampled
+    to the profile's DPI and compressed once with its codecs); for ReportLab
+    it is the resampled RGB image. The cache is rebuilt when frontpage.png's
+    mtime or size changes.
+    """
+    streaming = isinstance(canvas_obj, StreamingCanvas)
+    settings = OUTPUT_PROFILES[profile]
+    cache_key = (streaming, profile)
+    with _cover_lock:
+        key = _frontpage_key()
+        if key is None:
+            _cover.update(key=None, layout=None, images={})
+            return None
+        if _cover['key'] != key:
+            _cover.update(key=key, layout=None, images={})
+        if cache_key not in _cover['images']:
+            with Image.open(key[0]) as pil_img:
+                rgb = pil_img.convert('RGB')
+            layout = _cover_layout(rgb.width, rgb.height, width, height)
+            rgb, effective_dpi = fit_to_dpi(rgb, layout[2], layout[3], settings['dpi'])
+            _cover['layout'] = layout
+            _cover['images'][cache_key] = (
+                encode_image(rgb, BILEVEL_CODEC, jpeg_quality=settings['jpeg_quality']) if streaming else rgb
+            )
+            print(f"✅ Prepared frontpage.png as cover ({effective_dpi:.0f} DPI): {key[0]}")
+        return _cover['images'][cache_key], _cover['layout']
+
+
+def add_title_page(canvas_obj, book_details, width, height, profile=None):
     """Add a decorative title page using frontpage.png"""
     try:
-        # Path to frontpage image
-        frontpage_path = os.path.join(os.path.dirname(__file__), '..', 'images', 'frontpage.png')
-        
-        # If frontpage doesn't exist, try alternative path
-        if not os.path.exists(frontpage_path):
-            frontpage_path = os.path.join(os.path.dirname(__file__), '..', 'public', 'images', 'frontpage.png')
-        
-        if not os.path.exists(frontpage_path):
+        cover = _prepared_cover(canvas_obj, width, height, profile or PDF_PROFILE)
+
+        if cover is None:
             print(f"⚠️ Warning: frontpage.png not found, creating text-based title page")
             # Fallback to simple text title page
             canvas_obj.setFillColorRGB(0.91, 0.57, 0.78)  # Hera pink
@@ -129,42 +587,9 @@ def add_title_page(canvas_obj, book_details, width, height):
             canvas_obj.setFont("Helvetica", 20)
             canvas_obj.drawCentredString(width / 2, height / 2 - 50, "Your Personalized Coloring Book")
         else:
-            # Use frontpage.png as cover
-            print(f"✅ Using frontpage.png as cover: {frontpage_path}")
-            
-            # Open and resize frontpage to fit page
-            pil_img = Image.open(frontpage_path)
-            
-            # Convert to RGB if necessary
-            if pil_img.mode != 'RGB':
-                pil_img = pil_img.convert('RGB')
-            
-            # Calculate dimensions to fit page while maintaining aspect ratio
-            img_width, img_height = pil_img.size
-            aspect_ratio = img_width / img_height
-            
-            # Scale to fill entire page
-            if aspect_ratio > width / height:
-                # Image is wider - fit to height
-                new_height = height
-                new_width = height * aspect_ratio
-                x = (width - new_width) / 2
-                y = 0
-            else:
-                # Image is taller - fit to width
-                new_width = width
-                new_height = width / aspect_ratio
-                x = 0
-                y = (height - new_height) / 2
-            
-            # Convert PIL image to ImageReader for reportlab
-            img_buffer = io.BytesIO()
-            pil_img.save(img_buffer, format='PNG')
-            img_buffer.seek(0)
-            img_reader = ImageReader(img_buffer)
-            
             # Draw frontpage as full cover
-            canvas_obj.drawImage(img_reader, x, y, width=new_width, height=new_height)
+            image, (x, y, new_width, new_height) = cover
+            _draw_image(canvas_obj, image, x, y, new_width, new_height)
         
         # Start new page for actual coloring content
         canvas_obj.showPage()
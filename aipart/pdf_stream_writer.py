@@ -0,0 +1,338 @@
+"""
+Streaming PDF writer - flushes every page to disk as soon as it is finished
+
+ReportLab's Canvas keeps every page (and every compressed image) in memory
+until save(). StreamingCanvas implements the small subset of the Canvas API
+that pdf_generator uses, but writes each image XObject, content stream and
+page object to the output file immediately. Only the xref offsets and the
+page ids (a few bytes per page) are kept until save() writes the page tree,
+xref table and trailer, so peak memory does not grow with the page count.
+"""
+import io
+import os
+import zlib
+from PIL import Image, features
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+# Object numbers reserved up front; both are written last, by save()
+CATALOG_OBJ = 1
+PAGES_OBJ = 2
+
+COMPRESS_LEVEL = 6
+
+# Bilevel (mode '1') images: 'g4' = CCITT Group 4 (needs Pillow built with
+# libtiff, falls back to Flate otherwise), 'flate' = 1-bit Flate
+HAS_G4 = features.check('libtiff')
+
+
+def _num(value):
+    """Compact PDF number"""
+    if float(value).is_integer():
+        return str(int(value))
+    return f"{value:.3f}".rstrip('0').rstrip('.')
+
+
+def _ccitt_g4(pil_img):
+    """
+    CCITT Group 4 data of a mode '1' image, or None if Pillow lacks libtiff.
+    The image is written as a single-strip G4 TIFF and the strip is cut out.
+    """
+    if not HAS_G4:
+        return None
+    buffer = io.BytesIO()
+    pil_img.save(buffer, format='TIFF', compression='group4', strip_size=1 << 30)
+    with Image.open(buffer) as tiff:
+        offsets = tiff.tag_v2.get(273)
+        counts = tiff.tag_v2.get(279)
+    if not offsets or len(offsets) != 1:
+        return None
+    return buffer.getbuffer()[offsets[0]:offsets[0] + counts[0]].tobytes()
+
+
+class EncodedImage:
+    """
+    A compressed, ready-to-embed image XObject (dictionary entries + stream data).
+    Encode once with encode_image() and draw it into any number of canvases
+    without touching an image codec again.
+    """
+
+    __slots__ = ('width', 'height', 'entries', 'data')
+
+    def __init__(self, width, height, entries, data):
+        self.width = width
+        self.height = height
+        self.entries = entries
+        self.data = data
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+
+def encode_image(pil_img, bilevel_codec='g4', jpeg_quality=None):
+    """
+    Compress a PIL image into an EncodedImage.
+    With jpeg_quality, RGB and gray images are stored as JPEG (DCTDecode)
+    instead of lossless Flate.
+    """
+    if pil_img.mode not in ('RGB', 'L', '1', 'P'):
+        pil_img = pil_img.convert('RGB')
+
+    width, height = pil_img.size
+    header = f"/Type /XObject /Subtype /Image /Width {width} /Height {height} "
+    if jpeg_quality and pil_img.mode in ('RGB', 'L'):
+        buffer = io.BytesIO()
+        pil_img.save(buffer, format='JPEG', quality=jpeg_quality, optimize=True)
+        colorspace = '/DeviceRGB' if pil_img.mode == 'RGB' else '/DeviceGray'
+        return EncodedImage(width, height, header + (
+            f"/ColorSpace {colorspace} /BitsPerComponent 8 /Filter /DCTDecode"
+        ), buffer.getvalue())
+
+    if pil_img.mode == '1' and bilevel_codec == 'g4':
+        data = _ccitt_g4(pil_img)
+        if data is not None:
+            return EncodedImage(width, height, header + (
+                f"/ColorSpace /DeviceGray /BitsPerComponent 1 /Filter /CCITTFaxDecode "
+                f"/DecodeParms << /K -1 /Columns {width} /Rows {height} /BlackIs1 true >>"
+            ), data)
+
+    if pil_img.mode == 'RGB':
+        colorspace, bits = '/DeviceRGB', 8
+    elif pil_img.mode == 'L':
+        colorspace, bits = '/DeviceGray', 8
+    elif pil_img.mode == '1':
+        # PIL packs 1-bit rows MSB first with 1 = white, exactly like DeviceGray
+        colorspace, bits = '/DeviceGray', 1
+    else:
+        palette = pil_img.getpalette() or [0, 0, 0]
+        colors = max(1, min(256, len(palette) // 3))
+        colorspace = f"[/Indexed /DeviceRGB {colors - 1} <{bytes(palette[:colors * 3]).hex()}>]"
+        bits = 8
+
+    data = zlib.compress(pil_img.tobytes(), COMPRESS_LEVEL)
+    return EncodedImage(width, height, header + (
+        f"/ColorSpace {colorspace} /BitsPerComponent {bits} /Filter /FlateDecode"
+    ), data)
+
+
+def _pdf_string(text):
+    """Escape a Python string as a PDF literal string (WinAnsi)"""
+    escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return f"({escaped})"
+
+
+class StreamingCanvas:
+    """
+    Write-through PDF canvas.
+
+    Supported drawing calls mirror reportlab.pdfgen.canvas.Canvas:
+    drawImage (PIL images or pre-compressed EncodedImage), setFont,
+    drawString, drawCentredString, setFillColorRGB, setStrokeColorRGB, rect,
+    saveState, restoreState, translate, beginForm / endForm / doForm /
+    hasForm, showPage and save.
+    """
+
+    def __init__(self, filename, pagesize=A4, bilevel_codec='g4'):
+        self._filename = filename
+        self._pagesize = pagesize
+        self._bilevel_codec = bilevel_codec
+        self._file = open(filename, 'wb')
+        self._pos = 0
+        self._offsets = {}
+        self._next_obj = PAGES_OBJ + 1
+        self._page_ids = []
+        self._font_objs = {}
+        self._forms = {}  # name -> (resource name, object number)
+        self._form_state = None  # page state saved while a form is being recorded
+        self._image_count = 0
+        self._font = ('Helvetica', 12)
+        self._start_page()
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    # ── low-level object output ──────────────────────────────────────────
+
+    def _write(self, data):
+        self._file.write(data)
+        self._pos += len(data)
+
+    def _alloc(self):
+        num = self._next_obj
+        self._next_obj += 1
+        return num
+
+    def _write_object(self, num, body):
+        self._offsets[num] = self._pos
+        self._write(f"{num} 0 obj\n".encode('latin-1') + body + b"\nendobj\n")
+
+    def _write_stream(self, num, entries, data):
+        header = f"<< {entries} /Length {len(data)} >>\nstream\n".encode('latin-1')
+        self._write_object(num, header + data + b"\nendstream")
+
+    # ── page state ───────────────────────────────────────────────────────
+
+    def _start_page(self):
+        self._ops = []
+        self._page_fonts = {}
+        self._page_xobjects = {}
+
+    def _font_resource(self, font_name):
+        """Resource name of a standard Type1 font, writing its object on first use"""
+        if font_name not in self._font_objs:
+            num = self._alloc()
+            self._write_object(num, (
+                f"<< /Type /Font /Subtype /Type1 /BaseFont /{font_name} "
+                f"/Encoding /WinAnsiEncoding >>"
+            ).encode('latin-1'))
+            self._font_objs[font_name] = (f"F{len(self._font_objs) + 1}", num)
+        name, num = self._font_objs[font_name]
+        self._page_fonts[name] = num
+        return name
+
+    def _resources(self):
+        """Resource dictionary entries of the page (or form) being recorded"""
+        resources = []
+        if self._page_fonts:
+            fonts = ' '.join(f"/{name} {num} 0 R" for name, num in self._page_fonts.items())
+            resources.append(f"/Font << {fonts} >>")
+        if self._page_xobjects:
+            xobjects = ' '.join(f"/{name} {num} 0 R" for name, num in self._page_xobjects.items())
+            resources.append(f"/XObject << {xobjects} >>")
+        return ' '.join(resources)
+
+    def _image_xobject(self, image):
+        """Write an image XObject (PIL image or EncodedImage) now and return its object number"""
+        if not isinstance(image, EncodedImage):
+            image = encode_image(image, self._bilevel_codec)
+        num = self._alloc()
+        self._write_stream(num, image.entries, image.data)
+        return num
+
+    # ── Canvas API subset ────────────────────────────────────────────────
+
+    def drawImage(self, image, x, y, width=None, height=None):
+        """Draw a PIL image or EncodedImage with its lower-left corner at (x, y)"""
+        num = self._image_xobject(image)
+        self._image_count += 1
+        name = f"Im{self._image_count}"
+        self._page_xobjects[name] = num
+        width = image.size[0] if width is None else width
+        height = image.size[1] if height is None else height
+        self._ops.append(f"q {_num(width)} 0 0 {_num(height)} {_num(x)} {_num(y)} cm /{name} Do Q")
+
+    def setFont(self, font_name, size):
+        self._font = (font_name, size)
+
+    def drawString(self, x, y, text):
+        font_name, size = self._font
+        resource = self._font_resource(font_name)
+        self._ops.append(
+            f"BT /{resource} {_num(size)} Tf {_num(x)} {_num(y)} Td {_pdf_string(text)} Tj ET"
+        )
+
+    def drawCentredString(self, x, y, text):
+        font_name, size = self._font
+        self.drawString(x - stringWidth(text, font_name, size) / 2, y, text)
+
+    def setFillColorRGB(self, r, g, b):
+        self._ops.append(f"{_num(r)} {_num(g)} {_num(b)} rg")
+
+    def setStrokeColorRGB(self, r, g, b):
+        self._ops.append(f"{_num(r)} {_num(g)} {_num(b)} RG")
+
+    def rect(self, x, y, width, height, stroke=1, fill=0):
+        paint = {(1, 1): 'B', (0, 1): 'f', (1, 0): 'S'}.get((int(bool(stroke)), int(bool(fill))), 'n')
+        self._ops.append(f"{_num(x)} {_num(y)} {_num(width)} {_num(height)} re {paint}")
+
+    def saveState(self):
+        self._ops.append('q')
+
+    def restoreState(self):
+        self._ops.append('Q')
+
+    def translate(self, dx, dy):
+        self._ops.append(f"1 0 0 1 {_num(dx)} {_num(dy)} cm")
+
+    # ── form XObjects (elements drawn once, referenced from many pages) ──
+
+    def beginForm(self, name, lowerx=0, lowery=0, upperx=None, uppery=None):
+        """Record the following drawing calls as form `name` instead of page content"""
+        if self._form_state is not None:
+            raise ValueError("beginForm() called while another form is being recorded")
+        width, height = self._pagesize
+        self._form_state = (name, (lowerx, lowery, width if upperx is None else upperx,
+                                   height if uppery is None else uppery),
+                            self._ops, self._page_fonts, self._page_xobjects)
+        self._start_page()
+
+    def endForm(self):
+        """Write the recorded form XObject now and return to the page"""
+        name, bbox, ops, fonts, xobjects = self._form_state
+        content = zlib.compress('\n'.join(self._ops).encode('latin-1'), COMPRESS_LEVEL)
+        num = self._alloc()
+        self._write_stream(num, (
+            f"/Type /XObject /Subtype /Form /BBox [{' '.join(_num(v) for v in bbox)}] "
+            f"/Resources << {self._resources()} >> /Filter /FlateDecode"
+        ), content)
+        self._forms[name] = (f"Fm{len(self._forms) + 1}", num)
+        self._ops, self._page_fonts, self._page_xobjects = ops, fonts, xobjects
+        self._form_state = None
+
+    def hasForm(self, name):
+        return name in self._forms
+
+    def doForm(self, name):
+        """Draw a form written by beginForm()/endForm() at the current position"""
+        resource, num = self._forms[name]
+        self._page_xobjects[resource] = num
+        self._ops.append(f"/{resource} Do")
+
+    def showPage(self):
+        """Write the current page (content stream + page object) and start a new one"""
+        content = zlib.compress('\n'.join(self._ops).encode('latin-1'), COMPRESS_LEVEL)
+        content_num = self._alloc()
+        self._write_stream(content_num, '/Filter /FlateDecode', content)
+
+        page_num = self._alloc()
+        width, height = self._pagesize
+        self._write_object(page_num, (
+            f"<< /Type /Page /Parent {PAGES_OBJ} 0 R /MediaBox [0 0 {_num(width)} {_num(height)}] "
+            f"/Resources << {self._resources()} >> /Contents {content_num} 0 R >>"
+        ).encode('latin-1'))
+        self._page_ids.append(page_num)
+        self._file.flush()
+        self._start_page()
+
+    def getPageNumber(self):
+        return len(self._page_ids) + 1
+
+    def save(self):
+        """Write the page tree, catalog, xref table and trailer, then close the file"""
+        if self._ops or not self._page_ids:
+            self.showPage()
+
+        kids = ' '.join(f"{num} 0 R" for num in self._page_ids)
+        self._write_object(PAGES_OBJ, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>".encode('latin-1'))
+        self._write_object(CATALOG_OBJ, f"<< /Type /Catalog /Pages {PAGES_OBJ} 0 R >>".encode('latin-1'))
+        info_num = self._alloc()
+        self._write_object(info_num, b"<< /Producer (Hera streaming PDF writer) >>")
+
+        xref_pos = self._pos
+        lines = [f"xref\n0 {self._next_obj}\n", "0000000000 65535 f \n"]
+        for num in range(1, self._next_obj):
+            lines.append(f"{self._offsets[num]:010d} 00000 n \n")
+        lines.append(
+            f"trailer\n<< /Size {self._next_obj} /Root {CATALOG_OBJ} 0 R /Info {info_num} 0 R >>\n"
+            f"startxref\n{xref_pos}\n%%EOF\n"
+        )
+        self._write(''.join(lines).encode('latin-1'))
+        self._file.close()
+
+    def abort(self):
+        """Close and delete an unfinished PDF"""
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self._filename)
+        except OSError:
+            pass
@@ -0,0 +1,121 @@
+"""
+Preview cache for /api/generate
+Identical preview requests (double-clicks, effects firing twice, the same
+choices submitted again) reuse one Gemini render. Entries are keyed on the
+validated prompt parameters plus the prompt built from them, expire after
+PREVIEW_CACHE_TTL_SECONDS and are evicted least-recently-used once their
+image bytes exceed PREVIEW_CACHE_MAX_MB. Concurrent identical requests are
+coalesced: one caller renders, the others wait for its result.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+PREVIEW_CACHE_MAX_BYTES = int(float(os.getenv('PREVIEW_CACHE_MAX_MB', 32)) * 1024 * 1024)
+PREVIEW_CACHE_TTL_SECONDS = int(os.getenv('PREVIEW_CACHE_TTL_SECONDS', 600))
+
+# key -> (image bytes, stored_at); least recently used first
+_lock = threading.Lock()
+_entries = OrderedDict()
+_bytes = 0
+# key -> _Flight of the render in progress
+_in_flight = {}
+_stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'bypassed': 0, 'evictions': 0, 'expired': 0}
+
+
+class _Flight:
+    """One render in progress; followers wait on done for its result"""
+
+    __slots__ = ('done', 'result')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+def cache_key(params, prompt):
+    """Key of a preview request: its normalized prompt parameters and the prompt itself"""
+    normalized = {
+        'theme': [t.strip() for t in params.get('theme', [])],
+        'topic': params.get('topic', 'Cartoon'),
+        'difficulty': params.get('difficulty', 'Easy'),
+        'prompt': prompt,
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _evict(now):
+    """Drop expired entries, then least recently used ones over the byte budget (caller holds _lock)"""
+    global _bytes
+
+    for key in [k for k, (_, stored_at) in _entries.items() if now - stored_at >= PREVIEW_CACHE_TTL_SECONDS]:
+        _bytes -= len(_entries.pop(key)[0])
+        _stats['expired'] += 1
+    while _bytes > PREVIEW_CACHE_MAX_BYTES and _entries:
+        _, (data, _) = _entries.popitem(last=False)
+        _bytes -= len(data)
+        _stats['evictions'] += 1
+
+
+def get_or_generate(key, generate, fresh=False):
+    """
+    Image bytes for key: from the cache, from an identical render already in
+    progress, or from generate() (whose non-None result is then cached).
+    fresh skips the cache lookup (the customer asked for a new image) but
+    still joins an identical render in progress and caches its result.
+    """
+    global _bytes
+
+    with _lock:
+        now = time.time()
+        if not fresh:
+            entry = _entries.get(key)
+            if entry is not None and now - entry[1] < PREVIEW_CACHE_TTL_SECONDS:
+                _entries.move_to_end(key)
+                _stats['hits'] += 1
+                return entry[0]
+        flight = _in_flight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _in_flight[key] = _Flight()
+            _stats['bypassed' if fresh else 'misses'] += 1
+        else:
+            _stats['coalesced'] += 1
+
+    if not leader:
+        flight.done.wait()
+        return flight.result
+
+    try:
+        flight.result = generate()
+    finally:
+        with _lock:
+            del _in_flight[key]
+            data = flight.result
+            if data is not None and len(data) <= PREVIEW_CACHE_MAX_BYTES:
+                old = _entries.pop(key, None)
+                if old is not None:
+                    _bytes -= len(old[0])
+                _entries[key] = (data, time.time())
+                _bytes += len(data)
+                _evict(time.time())
+        flight.done.set()
+    return flight.result
+
+
+def get_cache_stats():
+    """Counters and current size of the preview cache"""
+    with _lock:
+        lookups = _stats['hits'] + _stats['misses'] + _stats['coalesced']
+        return {
+            **_stats,
+            'hit_rate': round((_stats['hits'] + _stats['coalesced']) / lookups, 3) if lookups else None,
+            'entries': len(_entries),
+            'in_flight': len(_in_flight),
+            'bytes': _bytes,
+            'max_bytes': PREVIEW_CACHE_MAX_BYTES,
+            'ttl_seconds': PREVIEW_CACHE_TTL_SECONDS,
+        }
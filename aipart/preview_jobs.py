@@ -0,0 +1,117 @@
+"""
+Asynchronous preview jobs for /api/generate
+A preview render waits on Gemini for many seconds. Instead of holding the
+request open, /api/generate can hand the render to a small bounded thread
+pool and return a job id; the client polls /api/generate/<job_id> for the
+result. At most PREVIEW_WORKERS renders run at once and at most
+PREVIEW_MAX_PENDING are accepted (running + waiting) before new ones are
+refused, so previews can never pile up unbounded behind a slow API.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+PREVIEW_WORKERS = int(os.getenv('PREVIEW_WORKERS', 2))
+PREVIEW_MAX_PENDING = int(os.getenv('PREVIEW_MAX_PENDING', 8))
+
+# Finished jobs stay pollable this long (seconds)
+PREVIEW_RESULT_TTL_SECONDS = int(os.getenv('PREVIEW_RESULT_TTL_SECONDS', 600))
+
+_executor = ThreadPoolExecutor(max_workers=PREVIEW_WORKERS, thread_name_prefix='preview')
+
+# job_id -> {'state', 'created_at', 'updated_at', 'result', 'error'}. States
+# move queued → running → done | failed; oldest-updated entries sit at the front.
+_jobs_lock = threading.Lock()
+_jobs = OrderedDict()
+_pending = 0
+
+
+class PreviewQueueFull(Exception):
+    """Raised by submit_preview() when PREVIEW_MAX_PENDING jobs are already pending"""
+
+
+def _update(job_id, state, **details):
+    """Move a job to a new state; finished jobs age out after PREVIEW_RESULT_TTL_SECONDS"""
+    now = time.time()
+    with _jobs_lock:
+        entry = _jobs.get(job_id)
+        if entry is None:
+            return
+        entry.update(details, state=state, updated_at=now)
+        _jobs.move_to_end(job_id)
+        _expire(now)
+
+
+def _expire(now):
+    """Drop expired finished jobs from the front of the index (caller holds _jobs_lock)"""
+    while _jobs:
+        oldest_id, oldest = next(iter(_jobs.items()))
+        if oldest['state'] not in ('done', 'failed') or now - oldest['updated_at'] < PREVIEW_RESULT_TTL_SECONDS:
+            break
+        del _jobs[oldest_id]
+
+
+def _run(job_id, render, args):
+    global _pending
+
+    _update(job_id, 'running')
+    try:
+        result = render(*args)
+        if result is None:
+            _update(job_id, 'failed', error='Failed to generate image')
+        else:
+            _update(job_id, 'done', result=result)
+    except Exception as e:
+        print(f"❌ Preview job {job_id} failed: {str(e)[:200]}")
+        import traceback
+        traceback.print_exc()
+        _update(job_id, 'failed', error='Image generation failed. Please try again.')
+    finally:
+        with _jobs_lock:
+            _pending -= 1
+
+
+def submit_preview(render, *args):
+    """
+    Run render(*args) on the preview pool and return the new job id.
+    render returns the result dict for the client, or None on failure.
+    Raises PreviewQueueFull when PREVIEW_MAX_PENDING jobs are pending.
+    """
+    global _pending
+
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with _jobs_lock:
+        if _pending >= PREVIEW_MAX_PENDING:
+            raise PreviewQueueFull()
+        _pending += 1
+        _expire(now)
+        _jobs[job_id] = {'state': 'queued', 'created_at': now, 'updated_at': now,
+                         'result': None, 'error': None}
+    _executor.submit(_run, job_id, render, args)
+    return job_id
+
+
+def get_preview_job(job_id):
+    """Copy of a job's entry (state, result, error), or None if unknown or expired"""
+    with _jobs_lock:
+        entry = _jobs.get(job_id)
+        return dict(entry) if entry is not None else None
+
+
+def get_preview_status():
+    """Pool size and job counts per state"""
+    with _jobs_lock:
+        states = {}
+        for entry in _jobs.values():
+            states[entry['state']] = states.get(entry['state'], 0) + 1
+        pending = _pending
+    return {
+        'workers': PREVIEW_WORKERS,
+        'max_pending': PREVIEW_MAX_PENDING,
+        'pending': pending,
+        'jobs': states,
+    }
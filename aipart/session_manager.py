@@ -3,10 +3,14 @@ Session Manager - Maps Stripe session IDs to generated PDFs
 """
 import json
 import os
+import threading
 from datetime import datetime, timedelta
 
 SESSION_FILE = 'session_pdf_mapping.json'
 
+# Serializes read-modify-write of SESSION_FILE (job threads register, the janitor prunes)
+_lock = threading.Lock()
+
 def load_sessions():
     """Load session mapping from file"""
     if os.path.exists(SESSION_FILE):
@@ -15,20 +19,23 @@ def load_sessions():
     return {}
 
 def save_sessions(sessions):
-    """Save session mapping to file"""
-    with open(SESSION_FILE, 'w') as f:
+    """Save session mapping to file (write-then-rename, so readers never see half a file)"""
+    tmp_path = f"{SESSION_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
         json.dump(sessions, f, indent=2)
+    os.replace(tmp_path, SESSION_FILE)
 
 def register_session(session_id, pdf_filename, email):
     """Register a session with its generated PDF"""
-    sessions = load_sessions()
-    sessions[session_id] = {
-        'pdf_filename': pdf_filename,
-        'email': email,
-        'created_at': datetime.now().isoformat(),
-        'status': 'completed'
-    }
-    save_sessions(sessions)
+    with _lock:
+        sessions = load_sessions()
+        sessions[session_id] = {
+            'pdf_filename': pdf_filename,
+            'email': email,
+            'created_at': datetime.now().isoformat(),
+            'status': 'completed'
+        }
+        save_sessions(sessions)
     
 def get_session_pdf(session_id):
     """Get PDF filename for a session"""
@@ -37,13 +44,15 @@ def get_session_pdf(session_id):
 
 def clean_old_sessions(days=7):
     """Remove sessions older than X days"""
-    sessions = load_sessions()
-    cutoff = datetime.now() - timedelta(days=days)
-    
-    cleaned = {
-        sid: data for sid, data in sessions.items()
-        if datetime.fromisoformat(data['created_at']) > cutoff
-    }
-    
-    save_sessions(cleaned)
-    return len(sessions) - len(cleaned)
+    with _lock:
+        sessions = load_sessions()
+        cutoff = datetime.now() - timedelta(days=days)
+        
+        cleaned = {
+            sid: data for sid, data in sessions.items()
+            if datetime.fromisoformat(data['created_at']) > cutoff
+        }
+        
+        if len(cleaned) != len(sessions):
+            save_sessions(cleaned)
+        return len(sessions) - len(cleaned)
@@ -10,6 +10,10 @@ from reportlab.lib.utils import ImageReader
 from reportlab.platypus import Paragraph
 from reportlab.lib.styles import ParagraphStyle
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'aipart'))
+from pdf_generator import draw_shared
 
 # Hera brand colors (from the actual website)
 COLORS = {
@@ -34,6 +38,63 @@ def draw_gradient_rect(c, x, y, width, height, color1, color2):
         step_height = height / steps
         c.rect(x, y + i * step_height, width, step_height, fill=True, stroke=False)
 
+def draw_header(c, width, height):
+    """Gradient header with the logo (a shared form: the 50 gradient bands are written once per document)"""
+    def header(c):
+        draw_gradient_rect(c, 0, height - 10*cm, width, 10*cm, COLORS['purple_main'], COLORS['purple_dark'])
+        
+        # Logo/Title
+        c.setFillColor(COLORS['white'])
+        c.setFont("Helvetica-Bold", 52)
+        c.drawCentredString(width/2, height - 4*cm, "Hera")
+        
+        # Emoji decoration
+        c.setFont("Helvetica", 30)
+        c.drawCentredString(width/2, height - 5.2*cm, "✨ 🎨 ✨")
+    
+    draw_shared(c, 'header', header)
+    
+    # Decorative circles (like the website) – kept out of the form, ReportLab
+    # only gives pages the transparency state they need
+    c.setFillColor(colors.Color(1, 1, 1, alpha=0.1))
+    c.circle(width * 0.2, height - 4*cm, 3*cm, fill=True, stroke=False)
+    c.circle(width * 0.8, height - 7*cm, 4*cm, fill=True, stroke=False)
+
+def draw_step_bullet(c, x, y):
+    """Colored circle behind a step number (a shared form, placed at x, y)"""
+    radius = 0.4*cm
+    def bullet(c):
+        c.setFillColor(COLORS['purple_main'])
+        c.circle(0, 0, radius, fill=True, stroke=False)
+    
+    draw_shared(c, 'step_bullet', bullet, x, y, bbox=(-radius, -radius, radius, radius))
+
+def draw_footer(c, width, footer_y):
+    """Divider, QR codes and contact lines (a shared form; captions are drawn per language)"""
+    def footer(c):
+        # Decorative line
+        c.setStrokeColor(COLORS['purple_main'])
+        c.setLineWidth(2)
+        c.line(2*cm, footer_y, width - 2*cm, footer_y)
+        
+        # Website QR Code (Left), Instagram QR Code (Right)
+        for path, x in (('images/link_website.jpg', 4*cm), ('images/insta_link.jpeg', width - 7*cm)):
+            try:
+                c.drawImage(ImageReader(path), x, footer_y - 4.5*cm, width=3*cm, height=3*cm, preserveAspectRatio=True)
+            except:
+                c.setStrokeColor(COLORS['purple_main'])
+                c.rect(x, footer_y - 4.5*cm, 3*cm, 3*cm)
+        
+        # Contact info
+        c.setFillColor(COLORS['text_gray'])
+        c.setFont("Helvetica", 9)
+        c.drawCentredString(width/2, 1.2*cm, "📧 hera.work.noreply@gmail.com")
+        c.setFont("Helvetica-Bold", 9)
+        c.setFillColor(COLORS['purple_main'])
+        c.drawCentredString(width/2, 0.6*cm, "Made with 💜 by Hera Team")
+    
+    draw_shared(c, 'footer', footer)
+
 def create_prospectus_english():
     """Create English version of the prospectus"""
     filename = "Hera_Prospectus_English.pdf"
@@ -41,21 +102,8 @@ def create_prospectus_english():
     width, height = A4
     
     # ===== BEAUTIFUL GRADIENT HEADER =====
-    draw_gradient_rect(c, 0, height - 10*cm, width, 10*cm, COLORS['purple_main'], COLORS['purple_dark'])
-    
-    # Decorative circles (like the website)
-    c.setFillColor(colors.Color(1, 1, 1, alpha=0.1))
-    c.circle(width * 0.2, height - 4*cm, 3*cm, fill=True, stroke=False)
-    c.circle(width * 0.8, height - 7*cm, 4*cm, fill=True, stroke=False)
-    
-    # Logo/Title
+    draw_header(c, width, height)
     c.setFillColor(COLORS['white'])
-    c.setFont("Helvetica-Bold", 52)
-    c.drawCentredString(width/2, height - 4*cm, "Hera")
-    
-    # Emoji decoration
-    c.setFont("Helvetica", 30)
-    c.drawCentredString(width/2, height - 5.2*cm, "✨ 🎨 ✨")
     
     # Subtitle
     c.setFont("Helvetica", 22)
@@ -103,8 +151,7 @@ def create_prospectus_english():
     
     for emoji, title, desc in steps:
         # Colored circle for step number
-        c.setFillColor(COLORS['purple_main'])
-        c.circle(2.8*cm, y_pos + 0.1*cm, 0.4*cm, fill=True, stroke=False)
+        draw_step_bullet(c, 2.8*cm, y_pos + 0.1*cm)
         
         c.setFillColor(COLORS['white'])
         c.setFont("Helvetica-Bold", 12)
@@ -170,49 +217,18 @@ def create_prospectus_english():
     
     # ===== FOOTER WITH QR CODES =====
     footer_y = 5*cm
-    
-    # Decorative line
-    c.setStrokeColor(COLORS['purple_main'])
-    c.setLineWidth(2)
-    c.line(2*cm, footer_y, width - 2*cm, footer_y)
+    draw_footer(c, width, footer_y)
     
     # QR Codes section title
     c.setFillColor(COLORS['purple_dark'])
     c.setFont("Helvetica-Bold", 14)
     c.drawCentredString(width/2, footer_y - 1*cm, "📱 Scan to Connect")
     
-    # Website QR Code (Left)
-    try:
-        qr_website = ImageReader('images/link_website.jpg')
-        c.drawImage(qr_website, 4*cm, footer_y - 4.5*cm, width=3*cm, height=3*cm, preserveAspectRatio=True)
-    except:
-        c.setStrokeColor(COLORS['purple_main'])
-        c.rect(4*cm, footer_y - 4.5*cm, 3*cm, 3*cm)
-    
     c.setFillColor(COLORS['text_dark'])
     c.setFont("Helvetica-Bold", 11)
     c.drawCentredString(5.5*cm, footer_y - 5.2*cm, "🌐 Website")
-    
-    # Instagram QR Code (Right)
-    try:
-        qr_insta = ImageReader('images/insta_link.jpeg')
-        c.drawImage(qr_insta, width - 7*cm, footer_y - 4.5*cm, width=3*cm, height=3*cm, preserveAspectRatio=True)
-    except:
-        c.setStrokeColor(COLORS['purple_main'])
-        c.rect(width - 7*cm, footer_y - 4.5*cm, 3*cm, 3*cm)
-    
-    c.setFillColor(COLORS['text_dark'])
-    c.setFont("Helvetica-Bold", 11)
     c.drawCentredString(width - 5.5*cm, footer_y - 5.2*cm, "📸 Instagram")
     
-    # Contact info
-    c.setFillColor(COLORS['text_gray'])
-    c.setFont("Helvetica", 9)
-    c.drawCentredString(width/2, 1.2*cm, "📧 hera.work.noreply@gmail.com")
-    c.setFont("Helvetica-Bold", 9)
-    c.setFillColor(COLORS['purple_main'])
-    c.drawCentredString(width/2, 0.6*cm, "Made with 💜 by Hera Team")
-    
     c.save()
     print(f"✅ English prospectus created: {filename}")
 
@@ -223,21 +239,8 @@ def create_prospectus_korean():
     width, height = A4
     
     # ===== BEAUTIFUL GRADIENT HEADER =====
-    draw_gradient_rect(c, 0, height - 10*cm, width, 10*cm, COLORS['purple_main'], COLORS['purple_dark'])
-    
-    # Decorative circles
-    c.setFillColor(colors.Color(1, 1, 1, alpha=0.1))
-    c.circle(width * 0.2, height - 4*cm, 3*cm, fill=True, stroke=False)
-    c.circle(width * 0.8, height - 7*cm, 4*cm, fill=True, stroke=False)
-    
-    # Logo/Title
+    draw_header(c, width, height)
     c.setFillColor(COLORS['white'])
-    c.setFont("Helvetica-Bold", 52)
-    c.drawCentredString(width/2, height - 4*cm, "Hera")
-    
-    # Emoji decoration
-    c.setFont("Helvetica", 30)
-    c.drawCentredString(width/2, height - 5.2*cm, "✨ 🎨 ✨")
     
     # Subtitle (Korean)
     c.setFont("Helvetica", 22)
@@ -284,8 +287,7 @@ def create_prospectus_korean():
     ]
     
     for emoji, title, desc in steps:
-        c.setFillColor(COLORS['purple_main'])
-        c.circle(2.8*cm, y_pos + 0.1*cm, 0.4*cm, fill=True, stroke=False)
+        draw_step_bullet(c, 2.8*cm, y_pos + 0.1*cm)
         
         c.setFillColor(COLORS['white'])
         c.setFont("Helvetica-Bold", 12)
@@ -351,46 +353,17 @@ def create_prospectus_korean():
     
     # ===== FOOTER WITH QR CODES =====
     footer_y = 5*cm
-    
-    c.setStrokeColor(COLORS['purple_main'])
-    c.setLineWidth(2)
-    c.line(2*cm, footer_y, width - 2*cm, footer_y)
+    draw_footer(c, width, footer_y)
     
     c.setFillColor(COLORS['purple_dark'])
     c.setFont("Helvetica-Bold", 14)
     c.drawCentredString(width/2, footer_y - 1*cm, "📱 스캔하여 연결하기")
     
-    # QR Codes
-    try:
-        qr_website = ImageReader('images/link_website.jpg')
-        c.drawImage(qr_website, 4*cm, footer_y - 4.5*cm, width=3*cm, height=3*cm, preserveAspectRatio=True)
-    except:
-        c.setStrokeColor(COLORS['purple_main'])
-        c.rect(4*cm, footer_y - 4.5*cm, 3*cm, 3*cm)
-    
     c.setFillColor(COLORS['text_dark'])
     c.setFont("Helvetica-Bold", 11)
     c.drawCentredString(5.5*cm, footer_y - 5.2*cm, "🌐 웹사이트")
-    
-    try:
-        qr_insta = ImageReader('images/insta_link.jpeg')
-        c.drawImage(qr_insta, width - 7*cm, footer_y - 4.5*cm, width=3*cm, height=3*cm, preserveAspectRatio=True)
-    except:
-        c.setStrokeColor(COLORS['purple_main'])
-        c.rect(width - 7*cm, footer_y - 4.5*cm, 3*cm, 3*cm)
-    
-    c.setFillColor(COLORS['text_dark'])
-    c.setFont("Helvetica-Bold", 11)
     c.drawCentredString(width - 5.5*cm, footer_y - 5.2*cm, "📸 인스타그램")
     
-    # Contact
-    c.setFillColor(COLORS['text_gray'])
-    c.setFont("Helvetica", 9)
-    c.drawCentredString(width/2, 1.2*cm, "📧 hera.work.noreply@gmail.com")
-    c.setFont("Helvetica-Bold", 9)
-    c.setFillColor(COLORS['purple_main'])
-    c.drawCentredString(width/2, 0.6*cm, "Made with 💜 by Hera Team")
-    
     c.save()
     print(f"✅ Korean prospectus created: {filename}")
 
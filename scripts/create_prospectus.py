@@ -10,6 +10,10 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.utils import ImageReader
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'aipart'))
+from pdf_generator import draw_shared
 
 def create_prospectus():
     """Create a beautiful prospectus for Hera"""
@@ -79,11 +83,14 @@ def create_prospectus():
         ("4️⃣ Téléchargez", "Recevez votre PDF unique par email en quelques minutes !")
     ]
     
+    def step_box(c):
+        c.setFillColor(purple_light)
+        c.roundRect(0, 0, width - 5*cm, 1*cm, 0.3*cm, fill=True, stroke=False)
+    
     c.setFont("Helvetica", 11)
     for step_title, step_desc in steps:
-        # Light purple box
-        c.setFillColor(purple_light)
-        c.roundRect(2.5*cm, y_position - 0.5*cm, width - 5*cm, 1*cm, 0.3*cm, fill=True, stroke=False)
+        # Light purple box (a shared form, written once)
+        draw_shared(c, 'step_box', step_box, 2.5*cm, y_position - 0.5*cm, bbox=(0, 0, width - 5*cm, 1*cm))
         
         # Text
         c.setFillColor(purple_dark)
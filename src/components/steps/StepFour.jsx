@@ -4,10 +4,13 @@ import { useTranslation } from 'react-i18next'
 import { BACKEND_URL } from '../../config/api'
 import usePromoInfo from '../../hooks/usePromoInfo'
 
+const PREVIEW_POLL_MS = 1500
+
 const StepFour = ({ selections }) => {
   const { t } = useTranslation()
   const [loading, setLoading] = useState(false)
   const [generatedImage, setGeneratedImage] = useState(null)
+  const [previewFile, setPreviewFile] = useState(null)
   const [error, setError] = useState(null)
   const [format, setFormat] = useState('pdf')
   const [bookType, setBookType] = useState('blackwhite')
@@ -28,14 +31,27 @@ const StepFour = ({ selections }) => {
           topic: selections.topic,
           difficulty: selections.difficulty,
           pages: selections.pages,
-          colors: selections.colors
+          colors: selections.colors,
+          // Render in the background and poll, so the request does not hold a server thread
+          async: true,
+          // Asking again after seeing a preview means "give me a new one", not the cached one
+          fresh: Boolean(generatedImage)
         }),
       })
 
-      const data = await response.json()
+      let data = await response.json()
+
+      // Poll the preview job until it is done or failed
+      while (data.success && data.job_id && data.status !== 'done') {
+        await new Promise((resolve) => setTimeout(resolve, PREVIEW_POLL_MS))
+        const poll = await fetch(`${BACKEND_URL}/api/generate/${data.job_id}`)
+        data = { ...(await poll.json()), job_id: data.job_id }
+      }
 
       if (data.success) {
-        setGeneratedImage(data.image)
+        // Cacheable URL of the stored preview (inline base64 only if asked for)
+        setGeneratedImage(data.image_url ? `${BACKEND_URL}${data.image_url}` : data.image)
+        setPreviewFile(data.filename)
       } else {
         setError(data.error || 'Failed to generate image')
       }
@@ -78,8 +94,9 @@ const StepFour = ({ selections }) => {
         body: JSON.stringify({
           format: format,
           bookType: bookType,
-          selections: selections
-          // No preview image - we'll regenerate all N pages fresh
+          selections: selections,
+          // The approved preview is reused as page 1 of the book
+          previewFile: previewFile
         }),
       })
 
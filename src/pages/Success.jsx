@@ -12,8 +12,10 @@ const Success = () => {
   const sessionId = searchParams.get('session_id')
   const [generationStatus, setGenerationStatus] = useState('checking') // checking, generating, completed, error
   const [pdfFilename, setPdfFilename] = useState(null)
+  const [pdfVariants, setPdfVariants] = useState([])
   const [statusMessage, setStatusMessage] = useState(t('success.loading'))
   const [showPdf, setShowPdf] = useState(false)
+  const [thumbnails, setThumbnails] = useState([])
 
   useEffect(() => {
     if (!sessionId) {
@@ -23,45 +25,101 @@ const Success = () => {
     }
 
     const backendUrl = BACKEND_URL
+    let pollInterval = null
+    let events = null
 
-    // Poll for generation status every 3 seconds, stop after 100 polls (~5 minutes)
-    let pollCount = 0
-    const MAX_POLLS = 100
-    const pollInterval = setInterval(() => {
-      pollCount++
-      if (pollCount >= MAX_POLLS) {
-        clearInterval(pollInterval)
+    // Apply a status update; returns true once generation has finished
+    const handleStatus = (data) => {
+      if (!data.success) return false
+      if (data.status === 'completed') {
+        setGenerationStatus('completed')
+        setPdfFilename(data.pdf_filename)
+        setPdfVariants(data.variants || [])
+        setStatusMessage(data.message)
+        return true
+      } else if (data.status === 'failed') {
         setGenerationStatus('error')
-        setStatusMessage('Generation is taking longer than expected. Please check your email or contact support at contact@herastudio.art.')
-        return
+        setStatusMessage(data.message)
+        return true
+      } else if (data.status === 'generating') {
+        setGenerationStatus('generating')
+        setStatusMessage(data.message)
+      } else {
+        setGenerationStatus('queued')
+        setStatusMessage(data.message)
       }
-      fetch(`${backendUrl}/api/generation-status/${sessionId}`)
-        .then(res => res.json())
-        .then(data => {
-          if (data.success) {
-            if (data.status === 'completed') {
-              setGenerationStatus('completed')
-              setPdfFilename(data.pdf_filename)
-              setStatusMessage(data.message)
+      return false
+    }
+
+    // Poll for generation status every 3 seconds, stop after 100 polls (~5 minutes)
+    const startPolling = () => {
+      let pollCount = 0
+      const MAX_POLLS = 100
+      pollInterval = setInterval(() => {
+        pollCount++
+        if (pollCount >= MAX_POLLS) {
+          clearInterval(pollInterval)
+          setGenerationStatus('error')
+          setStatusMessage('Generation is taking longer than expected. Please check your email or contact support at contact@herastudio.art.')
+          return
+        }
+        fetch(`${backendUrl}/api/generation-status/${sessionId}`)
+          .then(res => res.json())
+          .then(data => {
+            if (handleStatus(data)) {
               clearInterval(pollInterval)
-            } else if (data.status === 'generating') {
-              setGenerationStatus('generating')
-              setStatusMessage(data.message)
-            } else {
-              setGenerationStatus('queued')
-              setStatusMessage(data.message)
             }
-          }
-        })
-        .catch(err => {
-          console.error('Error checking generation status:', err)
-        })
-    }, 3000)
+          })
+          .catch(err => {
+            console.error('Error checking generation status:', err)
+          })
+      }, 3000)
+    }
+
+    // Prefer the server-sent event stream (one connection, an event per page);
+    // poll if the browser lacks EventSource or the server refuses the stream
+    if (window.EventSource) {
+      events = new EventSource(`${backendUrl}/api/generation-events/${sessionId}`)
+      const onEvent = (e) => {
+        if (handleStatus(JSON.parse(e.data))) {
+          events.close()
+        }
+      }
+      for (const name of ['queued', 'generating', 'page', 'completed', 'failed']) {
+        events.addEventListener(name, onEvent)
+      }
+      events.onerror = () => {
+        if (events.readyState === EventSource.CLOSED) {
+          startPolling()
+        }
+      }
+    } else {
+      startPolling()
+    }
 
     // Cleanup on unmount
-    return () => clearInterval(pollInterval)
+    return () => {
+      if (events) events.close()
+      if (pollInterval) clearInterval(pollInterval)
+    }
   }, [sessionId])
 
+  // Page thumbnails: a few KB each, so the book can be browsed without the PDF
+  useEffect(() => {
+    if (!pdfFilename) return
+
+    fetch(`${BACKEND_URL}/api/pdf-thumbnails/${pdfFilename}`)
+      .then(res => res.json())
+      .then(data => {
+        if (data.success) {
+          setThumbnails(data.thumbnails)
+        }
+      })
+      .catch(err => {
+        console.error('Error loading thumbnails:', err)
+      })
+  }, [pdfFilename])
+
   return (
     <div className="min-h-screen bg-gradient-to-br from-purple-100 via-pink-100 to-blue-100 relative overflow-hidden">
       <AnimatedBackground />
@@ -156,6 +214,21 @@ const Success = () => {
                   </p>
                 </div>
 
+                {/* Page thumbnails */}
+                {thumbnails.length > 0 && !showPdf && (
+                  <div className="grid grid-cols-3 sm:grid-cols-4 md:grid-cols-6 gap-3 mb-6">
+                    {thumbnails.map(thumb => (
+                      <img
+                        key={thumb.page}
+                        src={`${BACKEND_URL}${thumb.url}`}
+                        alt={`${thumb.page}`}
+                        loading="lazy"
+                        className="w-full rounded-lg shadow bg-gray-50"
+                      />
+                    ))}
+                  </div>
+                )}
+
                 {/* PDF Viewer Toggle */}
                 {!showPdf && (
                   <motion.button
@@ -187,7 +260,7 @@ const Success = () => {
                       
                       <div className="flex gap-4 justify-center">
                         <a
-                          href={`${BACKEND_URL}/api/download-pdf/${pdfFilename}`}
+                          href={`${BACKEND_URL}/api/download-pdf/${pdfFilename}${pdfVariants.includes('print') ? '?variant=print' : ''}`}
                           download
                           className="bg-hera-purple text-white font-fredoka font-bold text-lg px-6 py-3 rounded-full shadow-lg hover:bg-purple-700 transition"
                         >